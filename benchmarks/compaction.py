@@ -0,0 +1,56 @@
+"""Fill a memory with many near duplicate memories of several tenants, compare adding them with and without the duplicate check and compact the memory afterwards.
+The offline stub embeds texts by their words, so memories that differ in a few words score close to each other.
+
+Run with: python benchmarks/compaction.py [memories]"""
+
+import sys
+import time
+import random
+import tempfile
+from stubs import install_stubs, Stub_Embeddings
+
+install_stubs()
+
+from rhythm.integrations import Local_Vector_DB, Vector_DB
+
+_subjects = ["favourite color", "home town", "favourite food", "job", "pet", "birthday", "hobby", "favourite band"]
+_values = ["blue", "Berlin", "pizza", "teacher", "a cat named Tom", "the 3rd of May", "climbing", "the Beatles"]
+_phrasings = ["The {subject} of the user is {value}.", "The user said their {subject} is {value}.", "The {subject} of the user is {value}!", "Remember that the {subject} of the user is {value}."]
+
+def _memories(amount : int) -> list[tuple[str, dict]]:
+    random.seed(0)
+    now = time.time()
+    memories = []
+    for i in range(amount):
+        subject = random.randrange(len(_subjects))
+        text = random.choice(_phrasings).format(subject=_subjects[subject], value=_values[subject])
+        memories.append((f"{text} ({i % 7})", {"tenant" : f"tenant_{i % 10}", "timestamp" : now - random.uniform(0, 180 * 86400)}))
+    return memories
+
+def _fill(vector_db : Local_Vector_DB | Vector_DB, memories : list[tuple[str, dict]], duplicate_threshold : float | None) -> tuple[int, float]:
+    start = time.perf_counter()
+    added = sum(vector_db.add_to_db(text, metadata, duplicate_threshold=duplicate_threshold) for text, metadata in memories)
+    return added, time.perf_counter() - start
+
+def main(memories : int = 2000) -> None:
+    entries = _memories(memories)
+    embeddings = Stub_Embeddings(by_words=True)
+    with tempfile.TemporaryDirectory() as folder:
+        for name, create in [("Local_Vector_DB", lambda db_name: Local_Vector_DB(db_name=db_name, db_path=folder, embeddings=embeddings)), ("Vector_DB ':memory:'", lambda db_name: Vector_DB(db_name=db_name, db_url=":memory:", embeddings=embeddings))]:
+            plain = create("plain")
+            plain.create_db()
+            added, plain_time = _fill(plain, entries, None)
+            report = plain.compact(similarity=0.95, max_age=90 * 86400)
+
+            deduplicated = create("deduplicated")
+            deduplicated.create_db()
+            deduplicated_added, deduplicated_time = _fill(deduplicated, entries, 0.95)
+
+            print(f"{name}:")
+            print(f"  add without duplicate check: {added:6d} memories, {memories / plain_time:8.1f} memories/s")
+            print(f"  add with duplicate check:    {deduplicated_added:6d} memories, {memories / deduplicated_time:8.1f} memories/s")
+            print(f"  compact: {report['before']} -> {report['after']} memories, {report['duplicates']} duplicates and {report['stale']} stale removed")
+            print(f"  recall latency: {report['latency_before'] * 1000:.2f} ms before, {report['latency_after'] * 1000:.2f} ms after")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,44 @@
+"""Compare sequential `Robot.execute` with concurrent `Robot.aexecute` using offline stubs.
+
+Run with: python benchmarks/concurrent_sessions.py [sessions] [max_concurrency]"""
+
+import sys
+import time
+import asyncio
+from stubs import install_stubs
+
+install_stubs(chat_latency=0.05, embeddings_latency=0.01)
+
+from rhythm.robot import Robot, Vector_DB
+
+def main(sessions : int = 200, max_concurrency : int = 100) -> None:
+    memory_db = Vector_DB(db_name="benchmark", db_url=":memory:", db_api_key="", embeddings_api_key="")
+    memory_db.reset_db()
+    robot = Robot(memory_vector_db=memory_db, system_prompt="You are a benchmark robot.", openai_api_key="", max_concurrency=max_concurrency)
+
+    start = time.perf_counter()
+    for i in range(min(sessions, 20)):
+        robot.execute(f"Conversation {i}")
+    sequential = (time.perf_counter() - start) / min(sessions, 20)
+
+    async def run_concurrently() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*[robot.aexecute(f"Conversation {i}") for i in range(sessions)])
+        return time.perf_counter() - start
+
+    concurrent = asyncio.run(run_concurrently())
+
+    async def query_concurrently() -> float:
+        await asyncio.gather(*[memory_db.aadd_to_db(f"Memory number {i}") for i in range(sessions)])
+        start = time.perf_counter()
+        await asyncio.gather(*[memory_db.aget_from_db(f"Memory number {i}", 10, 0.0) for i in range(sessions)])
+        return time.perf_counter() - start
+
+    queries = asyncio.run(query_concurrently())
+
+    print(f"sequential execute:  {1 / sequential:8.1f} conversations/s")
+    print(f"concurrent aexecute: {sessions / concurrent:8.1f} conversations/s ({sessions} sessions, max_concurrency={max_concurrency})")
+    print(f"concurrent queries:  {sessions / queries:8.1f} queries/s")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,32 @@
+"""Compare sending mails one connection at a time with `EMail.send_many` over pooled connections, using a local SMTP server.
+
+Run with: python benchmarks/email_batch.py [mails] [max_connections]"""
+
+import sys
+import time
+from stubs import Stub_SMTP_Server
+
+from rhythm.integrations import EMail
+
+def main(mails : int = 200, max_connections : int = 4) -> None:
+    batch = [(f"reciver{i}@example.com", "Benchmark", f"Mail number {i}") for i in range(mails)]
+
+    with Stub_SMTP_Server(connect_latency=0.02) as server:
+        email = EMail(smtp_server_address="127.0.0.1", smtp_server_port=server.port, sender_address="sender@example.com", sender_application_password="", use_ssl=False)
+        start = time.perf_counter()
+        for reciver_address, subject, mail_text in batch[:min(mails, 50)]:
+            email.send_mail(reciver_address, subject, mail_text)
+        single = min(mails, 50) / (time.perf_counter() - start)
+        single_connections = server.connections
+
+        pooled = EMail(smtp_server_address="127.0.0.1", smtp_server_port=server.port, sender_address="sender@example.com", sender_application_password="", use_ssl=False, pooled=True, max_connections=max_connections)
+        start = time.perf_counter()
+        results = pooled.send_many(batch)
+        many = mails / (time.perf_counter() - start)
+        pooled.close()
+
+    print(f"send_mail: {single:8.1f} mails/s ({single_connections} connections)")
+    print(f"send_many: {many:8.1f} mails/s ({server.connections - single_connections} connections, {sum(result['sent'] for result in results)}/{mails} sent)")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
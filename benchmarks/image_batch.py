@@ -0,0 +1,57 @@
+"""Compare generating images one by one with `Image_Generator.create_images` using an offline stub, and the peak memory of decoding an image in one piece with the chunked decoding.
+
+Run with: python benchmarks/image_batch.py [images]"""
+
+import os
+import sys
+import time
+import base64
+import tempfile
+import tracemalloc
+from stubs import install_stubs
+
+install_stubs(image_latency=0.2)
+
+from rhythm.integrations import Image_Generator
+from rhythm.integrations.openai import _write_base64
+
+def main(images : int = 20) -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        files = [os.path.join(folder, f"image_{i}.png") for i in range(images)]
+
+        generator = Image_Generator(openai_model="dall-e-3", openai_api_key="")
+        start = time.perf_counter()
+        for i in range(min(images, 5)):
+            generator.create_image(prompt="Draw a dragon.", size="1024x1024", quality="hd", file=files[i])
+        single = min(images, 5) / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        generator.create_images(prompts=[f"Draw dragon number {i}." for i in range(images)], size="1024x1024", quality="hd", files=files, max_parallel=8)
+        concurrent = images / (time.perf_counter() - start)
+
+        batched_generator = Image_Generator(openai_model="dall-e-2", openai_api_key="")
+        start = time.perf_counter()
+        batched_generator.create_images(prompts=["Draw a dragon."] * images, size="1024x1024", quality="standard", files=files)
+        batched = images / (time.perf_counter() - start)
+
+        data = base64.b64encode(os.urandom(6 << 20)).decode()
+
+        tracemalloc.start()
+        with open(files[0], "wb") as writer:
+            writer.write(base64.decodebytes(str.encode(data)))
+        whole = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        with open(files[0], "wb") as writer:
+            _write_base64(data, writer)
+        chunked = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    print(f"create_image one by one:    {single:8.1f} images/s")
+    print(f"create_images concurrently: {concurrent:8.1f} images/s")
+    print(f"create_images with n > 1:   {batched:8.1f} images/s")
+    print(f"peak memory decoding a 6 MB image: {whole / (1 << 20):6.1f} MB in one piece, {chunked / (1 << 20):6.1f} MB in chunks")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,40 @@
+"""Measure the import time and the peak memory of importing parts of rhythm, every import runs in a fresh interpreter.
+
+Run with: python benchmarks/startup.py [runs]"""
+
+import os
+import sys
+import statistics
+import subprocess
+
+imports = [
+    "pass",
+    "import rhythm",
+    "import rhythm.integrations",
+    "from rhythm.integrations import EMail",
+    "from rhythm.integrations import Twitter",
+    "from rhythm.integrations import Local_Vector_DB",
+    "from rhythm.integrations import Agent",
+    "from rhythm import Robot",
+]
+
+measure = """
+import time, resource
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def main(runs : int = 5) -> None:
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [source, os.environ.get("PYTHONPATH")])))
+    for statement in imports:
+        seconds, memory = [], []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-W", "ignore", "-c", measure.format(statement=statement)], env=environment, capture_output=True, text=True, check=True).stdout.split()
+            seconds.append(float(output[0]))
+            memory.append(int(output[1]))
+        print(f"{statement:50} {statistics.median(seconds) * 1000:8.1f} ms {statistics.median(memory) / 1024:8.1f} MB")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
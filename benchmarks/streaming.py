@@ -0,0 +1,36 @@
+"""Compare the time to the first token of `Robot.stream` with the total latency of `Robot.execute` using offline stubs.
+
+Run with: python benchmarks/streaming.py [runs]"""
+
+import sys
+import time
+from stubs import install_stubs, Stub_Chat_Model
+
+install_stubs(chat_latency=0.05, embeddings_latency=0.01)
+
+from rhythm.robot import Robot, Vector_DB
+
+def main(runs : int = 20) -> None:
+    memory_db = Vector_DB(db_name="benchmark", db_url=":memory:", db_api_key="", embeddings_api_key="")
+    memory_db.reset_db()
+    llm = Stub_Chat_Model(latency=0.2, token_latency=0.02, answer=" ".join(["word"] * 50), tool_calls=[("add_to_memory", {"memory" : "A benchmark memory.", "topic" : "Benchmark", "subtopic" : "Streaming"})])
+    robot = Robot(memory_vector_db=memory_db, system_prompt="You are a benchmark robot.", openai_api_key="", llm=llm)
+
+    start = time.perf_counter()
+    for i in range(runs):
+        robot.execute(f"Conversation {i}")
+    total = (time.perf_counter() - start) / runs
+
+    first_tokens = []
+    for i in range(runs):
+        start = time.perf_counter()
+        for event in robot.stream(f"Conversation {i}"):
+            if(event["type"] == "token"):
+                first_tokens.append(time.perf_counter() - start)
+                break
+
+    print(f"execute total latency:  {total * 1000:8.1f} ms")
+    print(f"stream first token:     {sum(first_tokens) / len(first_tokens) * 1000:8.1f} ms")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
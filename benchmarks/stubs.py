@@ -0,0 +1,215 @@
+"""Offline stand-ins for the OpenAI chat and embeddings models used by the benchmarks."""
+
+import json
+import base64
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Any, AsyncIterator, Iterator
+from types import SimpleNamespace
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+class Stub_Chat_Model(BaseChatModel):
+    """A deterministic chat model that waits `latency` seconds.
+    It first requests all `tool_calls` in one turn, or one per turn with `sequential_tools`, if there are any, and then answers.
+    Every word of the answer after the first one takes another `token_latency` seconds."""
+
+    latency : float = 0.05
+    token_latency : float = 0.0
+    answer : str = "Done."
+    tool_calls : list[tuple[str, dict]] = []
+    sequential_tools : bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub-chat"
+
+    def __respond(self, messages : list[BaseMessage]) -> ChatResult:
+        done = 0
+        for message in reversed(messages):
+            if(isinstance(message, HumanMessage)):
+                break
+            done += isinstance(message, ToolMessage)
+        if(self.sequential_tools and done < len(self.tool_calls) or self.tool_calls and not done):
+            pending = list(enumerate(self.tool_calls))[done:done + 1] if self.sequential_tools else enumerate(self.tool_calls)
+            calls = [{"id" : f"call_{i}", "type" : "function", "function" : {"name" : name, "arguments" : json.dumps(arguments)}} for i, (name, arguments) in pending]
+            message = AIMessage(content="", additional_kwargs={"tool_calls" : calls})
+        else:
+            message = AIMessage(content=self.answer)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages : list[BaseMessage], stop : list[str] | None = None, run_manager : Any = None, **kwargs : Any) -> ChatResult:
+        time.sleep(self.latency + self.token_latency * (len(self.__chunks(messages)) - 1))
+        return self.__respond(messages)
+
+    async def _agenerate(self, messages : list[BaseMessage], stop : list[str] | None = None, run_manager : Any = None, **kwargs : Any) -> ChatResult:
+        await asyncio.sleep(self.latency + self.token_latency * (len(self.__chunks(messages)) - 1))
+        return self.__respond(messages)
+
+    def __chunks(self, messages : list[BaseMessage]) -> list[AIMessageChunk]:
+        message = self.__respond(messages).generations[0].message
+        if(message.additional_kwargs):
+            calls = [dict(call, index=i) for i, call in enumerate(message.additional_kwargs["tool_calls"])]
+            return [AIMessageChunk(content="", additional_kwargs={"tool_calls" : calls})]
+        words = message.content.split(" ")
+        return [AIMessageChunk(content=word if i == 0 else " " + word) for i, word in enumerate(words)]
+
+    def _stream(self, messages : list[BaseMessage], stop : list[str] | None = None, run_manager : Any = None, **kwargs : Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for i, chunk in enumerate(self.__chunks(messages)):
+            if(i > 0):
+                time.sleep(self.token_latency)
+            if(run_manager is not None):
+                run_manager.on_llm_new_token(chunk.content, chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages : list[BaseMessage], stop : list[str] | None = None, run_manager : Any = None, **kwargs : Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for i, chunk in enumerate(self.__chunks(messages)):
+            if(i > 0):
+                await asyncio.sleep(self.token_latency)
+            if(run_manager is not None):
+                await run_manager.on_llm_new_token(chunk.content, chunk=chunk)
+            yield ChatGenerationChunk(message=chunk)
+
+class Stub_Embeddings(Embeddings):
+    """Deterministic hash based embeddings with the dimensions of the openai embeddings.
+    With `by_words` a text is embedded as the sum of its hashed words, so texts sharing most of their words score close to each other."""
+
+    def __init__(self, size : int = 1536, latency : float = 0.0, by_words : bool = False) -> None:
+        self.size = size
+        self.latency = latency
+        self.by_words = by_words
+
+    def __hash(self, text : str) -> list[float]:
+        digest = hashlib.sha256(text.encode()).digest()
+        return [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(self.size)]
+
+    def __embed(self, text : str) -> list[float]:
+        if(not self.by_words):
+            return self.__hash(text)
+        vector = [0.0] * self.size
+        for word in text.lower().split():
+            vector = [total + value for total, value in zip(vector, self.__hash(word.strip(".,;:!?")))]
+        return vector
+
+    def embed_documents(self, texts : list[str]) -> list[list[float]]:
+        time.sleep(self.latency)
+        return [self.__embed(text) for text in texts]
+
+    def embed_query(self, text : str) -> list[float]:
+        time.sleep(self.latency)
+        return self.__embed(text)
+
+    async def aembed_documents(self, texts : list[str]) -> list[list[float]]:
+        await asyncio.sleep(self.latency)
+        return [self.__embed(text) for text in texts]
+
+    async def aembed_query(self, text : str) -> list[float]:
+        await asyncio.sleep(self.latency)
+        return self.__embed(text)
+
+class Stub_OpenAI():
+    """A stand-in for the openai client whose image generator waits `latency` seconds per request and returns random images of `image_size` bytes."""
+
+    def __init__(self, latency : float = 0.0, image_size : int = 3 << 20) -> None:
+        self.latency = latency
+        self.image_size = image_size
+        self.requests = 0
+        self.images = SimpleNamespace(generate=self.__generate)
+
+    def __generate(self, n : int = 1, **kwargs : Any) -> SimpleNamespace:
+        self.requests += 1
+        time.sleep(self.latency)
+        image = base64.b64encode(hashlib.sha256(str(self.requests).encode()).digest() * (self.image_size // 32)).decode()
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=image) for _ in range(n)])
+
+class Stub_Tweepy():
+    """A stand-in for the tweepy module whose API and client wait `latency` seconds per request.
+    Searches return `search_size` tweets with falling IDs and every created tweet gets the next ID as a string, like the v2 API gives it."""
+
+    class TooManyRequests(Exception):
+        pass
+
+    def __init__(self, latency : float = 0.0, search_size : int = 15) -> None:
+        self.latency = latency
+        self.search_size = search_size
+        self.requests = 0
+        self.__ids = iter(range(10**18, 0, -1))
+        self.__lock = threading.Lock()
+        self.OAuth1UserHandler = lambda *args, **kwargs: SimpleNamespace(set_access_token=lambda *args: None)
+        self.API = lambda *args, **kwargs: SimpleNamespace(search_tweets=self.__search_tweets, simple_upload=self.__simple_upload, send_direct_message=self.__request)
+        self.Client = lambda *args, **kwargs: SimpleNamespace(create_tweet=self.__create_tweet)
+
+    def __request(self, *args : Any, **kwargs : Any) -> None:
+        with self.__lock:
+            self.requests += 1
+        time.sleep(self.latency)
+
+    def __next_id(self) -> int:
+        with self.__lock:
+            return next(self.__ids)
+
+    def __search_tweets(self, q : str, count : int = 15, max_id : int | None = None, **kwargs : Any) -> list[SimpleNamespace]:
+        self.__request()
+        start = max_id if max_id is not None else 10**9
+        return [SimpleNamespace(id=start - i, full_text=f"Tweet {start - i} about {q}", text="", user=SimpleNamespace(name=f"user{i}")) for i in range(min(count, self.search_size))]
+
+    def __simple_upload(self, filename : str) -> SimpleNamespace:
+        self.__request()
+        return SimpleNamespace(media_id=self.__next_id())
+
+    def __create_tweet(self, **kwargs : Any) -> SimpleNamespace:
+        self.__request()
+        return SimpleNamespace(data={"id" : str(self.__next_id())})
+
+class Stub_SMTP_Server():
+    """A local SMTP server that accepts every mail, it waits `connect_latency` seconds per connection to stand in for the SSL handshake and login.
+    It needs the `aiosmtpd` package."""
+
+    def __init__(self, port : int = 8025, connect_latency : float = 0.0) -> None:
+        from aiosmtpd.controller import Controller
+
+        self.port = port
+        self.connect_latency = connect_latency
+        self.connections = 0
+        self.mails = 0
+        self.__controller = Controller(self, hostname="127.0.0.1", port=port)
+
+    async def handle_EHLO(self, server : Any, session : Any, envelope : Any, hostname : str, responses : list[str]) -> list[str]:
+        self.connections += 1
+        await asyncio.sleep(self.connect_latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server : Any, session : Any, envelope : Any) -> str:
+        self.mails += 1
+        return "250 OK"
+
+    def __enter__(self) -> "Stub_SMTP_Server":
+        self.__controller.start()
+        return self
+
+    def __exit__(self, *args : Any) -> None:
+        self.__controller.stop()
+
+def install_stubs(chat_latency : float = 0.05, embeddings_latency : float = 0.0, image_latency : float = 0.0, image_size : int = 3 << 20, twitter_latency : float = 0.0) -> None:
+    """Replace the openai and twitter clients inside rhythm with the offline stubs."""
+
+    import rhythm.integrations.openai as openai_integration
+    import rhythm.integrations.qdrant_db as qdrant_integration
+    import rhythm.integrations.local_db as local_integration
+    import rhythm.integrations.twitter as twitter_integration
+    import rhythm.robot as robot
+
+    openai_integration.ChatOpenAI = lambda **kwargs: Stub_Chat_Model(latency=chat_latency)
+    openai_integration.OpenAI = lambda **kwargs: Stub_OpenAI(latency=image_latency, image_size=image_size)
+    twitter_integration.tweepy = Stub_Tweepy(latency=twitter_latency)
+    robot.ChatOpenAI = lambda **kwargs: Stub_Chat_Model(latency=chat_latency)
+    robot.OpenAIEmbeddings = lambda **kwargs: Stub_Embeddings(latency=embeddings_latency)
+    qdrant_integration.OpenAIEmbeddings = lambda **kwargs: Stub_Embeddings(latency=embeddings_latency)
+    local_integration.OpenAIEmbeddings = lambda **kwargs: Stub_Embeddings(latency=embeddings_latency)
@@ -0,0 +1,233 @@
+"""Run the benchmark cases of the whole agent stack against offline stubs and compare them with a stored baseline.
+Every case reports its throughput, its p50 and p99 latency and the memory it allocates per operation.
+The chat and embeddings models, the openai and twitter clients and the SMTP server are stubs and qdrant runs in its `':memory:'` mode, so the results only depend on the framework.
+
+Run with: python benchmarks/suite.py [--case NAME ...] [--iterations N] [--baseline FILE] [--save-baseline] [--tolerance SHARE]
+The results are compared with `benchmarks/baseline.json` if it exists and the script exits with status 1 if a case regressed.
+Timings depend on the machine, record a baseline on the machine that runs the comparison with `--save-baseline`."""
+
+import os
+import gc
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from contextlib import ExitStack
+from typing import Any, Callable
+from stubs import install_stubs, Stub_Chat_Model, Stub_Embeddings, Stub_SMTP_Server
+
+install_stubs(chat_latency=0.0, image_size=64 << 10)
+
+from rhythm.robot import Robot
+from rhythm.tracing import _percentile
+from rhythm.integrations import Vector_DB, Local_Vector_DB, EMail, Twitter, Image_Generator
+
+_baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+_cases = {}
+
+# Differences below these amounts are noise on any machine and never count as a regression, the tail latency is the noisiest.
+_min_latency_change = 0.0002
+_min_tail_latency_change = 0.002
+_min_memory_change = 16 << 10
+
+def _case(name : str, iterations : int) -> Callable:
+    """Register a benchmark case, the decorated function gets an exit stack for its cleanup and returns the operation to measure, called with the number of the run."""
+
+    def register(setup : Callable[[ExitStack], Callable[[int], Any]]) -> Callable[[ExitStack], Callable[[int], Any]]:
+        _cases[name] = (setup, iterations)
+        return setup
+
+    return register
+
+def _memory_db(stack : ExitStack, name : str, entries : int = 0) -> Vector_DB:
+    memory_db = Vector_DB(db_name=name, db_url=":memory:", embeddings=Stub_Embeddings(by_words=True))
+    memory_db.create_db()
+    if(entries):
+        memory_db.add_many(((f"Memory number {i} of the user is about topic {i % 97}.", {"tenant" : f"tenant_{i % 10}"}) for i in range(entries)), max_in_flight=1)
+    return memory_db
+
+def _local_db(stack : ExitStack, name : str, entries : int = 0) -> Local_Vector_DB:
+    folder = stack.enter_context(tempfile.TemporaryDirectory())
+    memory_db = Local_Vector_DB(db_name=name, db_path=folder, embeddings=Stub_Embeddings(by_words=True))
+    if(entries):
+        memory_db.add_many((f"Memory number {i} of the user is about topic {i % 97}.", {"tenant" : f"tenant_{i % 10}"}) for i in range(entries))
+    return memory_db
+
+def _robot(stack : ExitStack, local : bool = False) -> Robot:
+    llm = Stub_Chat_Model(latency=0.0, tool_calls=[("recall_memory", {"query" : "favourite color"}), ("add_to_memory", {"memory" : "The favourite color of the user is blue.", "topic" : "User", "subtopic" : "Favourite color"})], sequential_tools=True)
+    # The tools are called one after the other, like a model that recalls before it remembers, and the concurrent runs cover the local database.
+    memory_db = _local_db(stack, "robot", 500) if local else _memory_db(stack, "robot", 500)
+    return Robot(memory_vector_db=memory_db, system_prompt="You are a benchmark robot.", llm=llm, recall_mode="direct")
+
+@_case("robot.execute", iterations=100)
+def _robot_execute(stack : ExitStack) -> Callable[[int], Any]:
+    robot = _robot(stack)
+    return lambda i: robot.execute(f"What is my favourite color? Attempt {i}.")
+
+@_case("robot.aexecute x16", iterations=20)
+def _robot_aexecute(stack : ExitStack) -> Callable[[int], Any]:
+    robot = _robot(stack, local=True)
+
+    async def run(i : int) -> list[str]:
+        return await asyncio.gather(*[robot.aexecute(f"What is my favourite color? Attempt {i}.{j}") for j in range(16)])
+
+    return lambda i: asyncio.run(run(i))
+
+@_case("vector_db.add_to_db", iterations=200)
+def _vector_db_add(stack : ExitStack) -> Callable[[int], Any]:
+    memory_db = _memory_db(stack, "add")
+    return lambda i: memory_db.add_to_db(f"The user mentioned fact number {i}.", {"tenant" : f"tenant_{i % 10}"})
+
+@_case("vector_db.add_to_db chunked", iterations=20)
+def _vector_db_add_chunked(stack : ExitStack) -> Callable[[int], Any]:
+    memory_db = _memory_db(stack, "chunked")
+    paragraph = "The user told a long story about their travels through the mountains and the people they met on the way. "
+    return lambda i: memory_db.add_to_db(f"Story {i}. " + paragraph * 40)
+
+@_case("vector_db.add_to_db deduplicated", iterations=200)
+def _vector_db_add_deduplicated(stack : ExitStack) -> Callable[[int], Any]:
+    memory_db = _memory_db(stack, "deduplicated", 2000)
+    return lambda i: memory_db.add_to_db(f"The user mentioned fact number {i}.", {"tenant" : f"tenant_{i % 10}"}, duplicate_threshold=0.95)
+
+@_case("vector_db.get_from_db", iterations=200)
+def _vector_db_get(stack : ExitStack) -> Callable[[int], Any]:
+    memory_db = _memory_db(stack, "get", 2000)
+    return lambda i: memory_db.get_from_db(f"topic {i % 97}", 10, 0.0, filters={"tenant" : f"tenant_{i % 10}"})
+
+@_case("vector_db.get_from_db hybrid", iterations=200)
+def _vector_db_get_hybrid(stack : ExitStack) -> Callable[[int], Any]:
+    memory_db = _memory_db(stack, "hybrid", 2000)
+    return lambda i: memory_db.get_from_db(f"topic {i % 97}", 10, 0.0, filters={"tenant" : f"tenant_{i % 10}"}, hybrid=True)
+
+@_case("local_vector_db.add_to_db", iterations=200)
+def _local_db_add(stack : ExitStack) -> Callable[[int], Any]:
+    memory_db = _local_db(stack, "add")
+    return lambda i: memory_db.add_to_db(f"The user mentioned fact number {i}.", {"tenant" : f"tenant_{i % 10}"})
+
+@_case("local_vector_db.get_from_db", iterations=200)
+def _local_db_get(stack : ExitStack) -> Callable[[int], Any]:
+    memory_db = _local_db(stack, "get", 5000)
+    return lambda i: memory_db.get_from_db(f"topic {i % 97}", 10, 0.0, filters={"tenant" : f"tenant_{i % 10}"}, hybrid=True)
+
+@_case("email.send_mail", iterations=200)
+def _email_send(stack : ExitStack) -> Callable[[int], Any]:
+    server = stack.enter_context(Stub_SMTP_Server(port=8026))
+    email = EMail(smtp_server_address="127.0.0.1", smtp_server_port=server.port, sender_address="sender@example.com", sender_application_password="", use_ssl=False, pooled=True)
+    stack.callback(email.close)
+    return lambda i: email.send_mail(f"reciver{i}@example.com", "Benchmark", f"Mail number {i}")
+
+@_case("twitter.tweet", iterations=200)
+def _twitter_tweet(stack : ExitStack) -> Callable[[int], Any]:
+    twitter = Twitter(consumer_key="", consumer_secret="", access_token="", access_token_secret="", bearer_token="", tweets_per_window=10**9)
+    return lambda i: twitter.tweet(textcontent=f"Tweet number {i}")
+
+@_case("twitter.get_tweets", iterations=200)
+def _twitter_search(stack : ExitStack) -> Callable[[int], Any]:
+    twitter = Twitter(consumer_key="", consumer_secret="", access_token="", access_token_secret="", bearer_token="", search_cache_ttl=0)
+    return lambda i: twitter.get_tweets(query=f"#topic{i % 20}", count=15)
+
+@_case("image_generator.create_image", iterations=100)
+def _image_create(stack : ExitStack) -> Callable[[int], Any]:
+    generator = Image_Generator(openai_model="dall-e-3", openai_api_key="")
+    return lambda i: generator.create_image(prompt=f"Draw dragon number {i}.", size="1024x1024", quality="standard")
+
+def _measure(operation : Callable[[int], Any], iterations : int) -> dict[str, float]:
+    """Run an operation after a warm up, first timed and then under tracemalloc, so the allocation tracing does not slow down the timings."""
+
+    warm_up = max(3, iterations // 10)
+    for i in range(warm_up):
+        operation(i)
+    gc.collect()
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(warm_up, warm_up + iterations):
+        started = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - started)
+    total = time.perf_counter() - start
+    latencies.sort()
+
+    traced = min(iterations, 20)
+    peaks = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(warm_up + iterations, warm_up + iterations + traced):
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            operation(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+        retained = (tracemalloc.get_traced_memory()[0] - before) / traced
+    finally:
+        tracemalloc.stop()
+
+    return {"throughput" : iterations / total, "p50" : _percentile(latencies, 0.5), "p99" : _percentile(latencies, 0.99), "peak_memory" : sorted(peaks)[len(peaks) // 2], "retained_memory" : retained}
+
+def _regressions(name : str, result : dict[str, float], baseline : dict[str, float], tolerance : float) -> list[str]:
+    """Compare a result with its baseline, the tail latency gets twice the tolerance because it is the noisiest."""
+
+    regressions = []
+    if(result["throughput"] < baseline["throughput"] / (1 + tolerance) and 1 / result["throughput"] - 1 / baseline["throughput"] > _min_latency_change):
+        regressions.append(f"{name}: throughput {result['throughput']:.1f}/s, baseline {baseline['throughput']:.1f}/s")
+    for metric, allowed, minimum in (("p50", tolerance, _min_latency_change), ("p99", 2 * tolerance, _min_tail_latency_change)):
+        if(result[metric] > baseline[metric] * (1 + allowed) and result[metric] - baseline[metric] > minimum):
+            regressions.append(f"{name}: {metric} {result[metric] * 1000:.3f} ms, baseline {baseline[metric] * 1000:.3f} ms")
+    if(result["peak_memory"] > baseline["peak_memory"] * (1 + tolerance) and result["peak_memory"] - baseline["peak_memory"] > _min_memory_change):
+        regressions.append(f"{name}: peak memory {result['peak_memory'] / 1024:.1f} KB, baseline {baseline['peak_memory'] / 1024:.1f} KB")
+    return regressions
+
+def main(arguments : list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite against offline stubs.")
+    parser.add_argument("--case", action="append", help="Only run the cases whose name contains this text, can be given more than once.")
+    parser.add_argument("--iterations", type=float, default=1.0, help="The factor for the amount of timed runs of every case.")
+    parser.add_argument("--baseline", default=_baseline_file, help="The baseline file to compare with or to save to.")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baseline instead of comparing with it.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="The share a result may be worse than the baseline before it counts as a regression.")
+    options = parser.parse_args(arguments)
+
+    results = {}
+    print(f"{'case':34s} {'ops/s':>10s} {'p50 ms':>9s} {'p99 ms':>9s} {'peak KB':>9s} {'kept KB':>9s}")
+    for name, (setup, iterations) in _cases.items():
+        if(options.case and not any(part in name for part in options.case)):
+            continue
+        with ExitStack() as stack:
+            try:
+                operation = setup(stack)
+            except ImportError as error:
+                print(f"{name:34s} skipped, {error}")
+                continue
+            result = _measure(operation, max(1, int(iterations * options.iterations)))
+        results[name] = result
+        print(f"{name:34s} {result['throughput']:10.1f} {result['p50'] * 1000:9.3f} {result['p99'] * 1000:9.3f} {result['peak_memory'] / 1024:9.1f} {result['retained_memory'] / 1024:9.1f}")
+
+    if(options.save_baseline):
+        baseline = {"python" : platform.python_version(), "machine" : platform.machine(), "cases" : results}
+        if(os.path.exists(options.baseline)):
+            with open(options.baseline, "r") as reader:
+                baseline["cases"] = dict(json.load(reader).get("cases", {}), **results)
+        with open(options.baseline, "w") as writer:
+            json.dump(baseline, writer, indent=4, sort_keys=True)
+        print(f"\nSaved the baseline to {options.baseline}")
+        return 0
+
+    if(not os.path.exists(options.baseline)):
+        print(f"\nNo baseline at {options.baseline}, save one with --save-baseline")
+        return 0
+    with open(options.baseline, "r") as reader:
+        baseline = json.load(reader)["cases"]
+    regressions = [regression for name, result in results.items() if name in baseline for regression in _regressions(name, result, baseline[name], options.tolerance)]
+    if(regressions):
+        print(f"\n{len(regressions)} regressions against {options.baseline}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against {options.baseline}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,54 @@
+"""Measure the overhead of tracing, for a single span and for whole `Robot.execute` runs against offline stubs, with tracing off and with tracing into every sink.
+
+Run with: python benchmarks/tracing.py [runs]"""
+
+import io
+import sys
+import time
+from stubs import install_stubs, Stub_Chat_Model
+
+install_stubs()
+
+from rhythm.robot import Robot
+from rhythm.integrations import Vector_DB
+from rhythm.tracing import Tracer, Memory_Sink, JSON_Lines_Sink, Prometheus_Sink, set_tracer, span
+
+def _span_cost(amount : int = 200000) -> float:
+    start = time.perf_counter()
+    for _ in range(amount):
+        with span("benchmark", size=1):
+            pass
+    return (time.perf_counter() - start) / amount
+
+def _run(robot : Robot, runs : int) -> float:
+    start = time.perf_counter()
+    for i in range(runs):
+        robot.execute(f"Remember that my favourite number is {i}.")
+    return (time.perf_counter() - start) / runs
+
+def main(runs : int = 50) -> None:
+    memory_db = Vector_DB(db_name="tracing", db_url=":memory:")
+    memory_db.create_db()
+    llm = Stub_Chat_Model(latency=0.0, tool_calls=[("recall_memory", {"query" : "favourite number"}), ("add_to_memory", {"memory" : "The favourite number is 7.", "topic" : "User", "subtopic" : "Favourite number"})])
+    robot = Robot(memory_vector_db=memory_db, system_prompt="You are a helpful assistant.", llm=llm, recall_mode="direct")
+    _run(robot, 5)
+
+    set_tracer(None)
+    disabled_span = _span_cost()
+    disabled_run = _run(robot, runs)
+
+    set_tracer(Tracer(sinks=[Memory_Sink(), Prometheus_Sink(), JSON_Lines_Sink(io.StringIO())]))
+    enabled_span = _span_cost()
+    memory = Memory_Sink()
+    set_tracer(Tracer(sinks=[memory, Prometheus_Sink(), JSON_Lines_Sink(io.StringIO())]))
+    enabled_run = _run(robot, runs)
+    set_tracer(None)
+
+    print(f"one span:          {disabled_span * 1e9:8.0f} ns off, {enabled_span * 1e9:8.0f} ns on")
+    print(f"Robot.execute:     {disabled_run * 1000:8.2f} ms off, {enabled_run * 1000:8.2f} ms on")
+    print(f"spans per execute: {len(memory.spans()) / runs:8.1f}")
+    for name, stats in memory.summary().items():
+        print(f"  {name:18s} p50 {stats['p50'] * 1000:7.2f} ms, p99 {stats['p99'] * 1000:7.2f} ms")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -23,6 +23,6 @@ setup(
         "Programming Language :: Python :: 3.12",
         "Operating System :: OS Independent",
     ],
-    install_requires=["langchain >= 0.0.350", "qdrant-client >= 1.7.0", "tweepy >= 4.14.0", "openai >= 1.4.0"],
+    install_requires=["langchain >= 0.0.350", "qdrant-client >= 1.7.0", "tweepy >= 4.14.0", "openai >= 1.4.0", "numpy >= 1.24.0", "tiktoken >= 0.5.0"],
     python_requires=">=3.12",
 )
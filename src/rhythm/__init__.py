@@ -1,4 +1,32 @@
 """A Framework for faster development with AI Agents.
-Exports only the base Robot agent."""
+Exports the base Robot agent, the Robot pool and the tracing, they are only imported when they are first used."""
 
-from .robot import Robot, tool
\ No newline at end of file
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if(TYPE_CHECKING):
+    from .robot import Robot, Robot_Pool, tool
+    from .tracing import Tracer, Memory_Sink, JSON_Lines_Sink, Prometheus_Sink, set_tracer
+
+_exports = {
+    "Robot" : ".robot",
+    "Robot_Pool" : ".robot",
+    "tool" : ".robot",
+    "Tracer" : ".tracing",
+    "Memory_Sink" : ".tracing",
+    "JSON_Lines_Sink" : ".tracing",
+    "Prometheus_Sink" : ".tracing",
+    "set_tracer" : ".tracing",
+}
+
+__all__ = list(_exports)
+
+def __getattr__(name : str) -> Any:
+    if(name not in _exports):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
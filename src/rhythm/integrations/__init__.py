@@ -1,7 +1,39 @@
 """A module containing all API integrations.
-Exports every integration class."""
+Exports every integration class, each one is only imported with its dependencies when it is first used."""
 
-from .openai import Agent, Image_Generator, tool
-from .qdrant_db import Vector_DB
-from .email import EMail
-from .twitter import Twitter
\ No newline at end of file
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if(TYPE_CHECKING):
+    from .openai import Agent, Session, Image_Generator, tool, set_tool_threads
+    from .qdrant_db import Vector_DB
+    from .local_db import Local_Vector_DB
+    from .cache import Embedding_Cache, Response_Cache
+    from .email import EMail
+    from .twitter import Twitter
+
+_exports = {
+    "Agent" : ".openai",
+    "Session" : ".openai",
+    "Image_Generator" : ".openai",
+    "tool" : ".openai",
+    "set_tool_threads" : ".openai",
+    "Vector_DB" : ".qdrant_db",
+    "Local_Vector_DB" : ".local_db",
+    "Embedding_Cache" : ".cache",
+    "Response_Cache" : ".cache",
+    "EMail" : ".email",
+    "Twitter" : ".twitter",
+}
+
+__all__ = list(_exports)
+
+def __getattr__(name : str) -> Any:
+    if(name not in _exports):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
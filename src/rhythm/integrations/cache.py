@@ -0,0 +1,473 @@
+"""A module containing all caches for API integrations."""
+
+import time
+import json
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+import numpy as np
+from typing import Any, Sequence
+from collections import OrderedDict
+from langchain_core.embeddings import Embeddings
+from langchain_core.tools import BaseTool, StructuredTool
+from ..tracing import count
+
+class Embedding_Cache():
+    """A cache for embedding vectors with an in-process LRU tier and an optional SQLite tier on disk."""
+
+    def __init__(self, max_entries : int = 10000, ttl : float | None = None, db_path : str | None = None, max_db_entries : int | None = None) -> None:
+        """A cache for embedding vectors with an in-process LRU tier and an optional SQLite tier on disk.
+
+        Arguments:
+
+            `max_entries`: The maximum amount of vectors kept in memory, the least recently used ones are evicted first, every vector of `1536` dimensions takes about 6KB.
+            `ttl`: The amount of seconds a vector stays valid, leave as `None` to keep vectors until they are evicted.
+            `db_path`: The file path of the SQLite database for the disk tier, leave as `None` to only cache in memory.
+            `max_db_entries`: The maximum amount of vectors kept on disk, the oldest ones are evicted first, leave as `None` for no limit, evictions run in batches, so the disk tier can hold up to a sixteenth more vectors in between.
+
+        Examples:
+
+        .. code-block:: python
+            from rhythm.integrations import Embedding_Cache, Vector_DB
+
+            embedding_cache = Embedding_Cache(max_entries=50000, ttl=86400, db_path="./embeddings.sqlite")
+            vector_db = Vector_DB(db_name=\"example\", embedding_cache=embedding_cache)"""
+
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__max_db_entries = max_db_entries
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__counters = {"hits" : 0, "misses" : 0, "memory_hits" : 0, "disk_hits" : 0, "embedded_texts" : 0, "embedding_seconds" : 0.0}
+
+        self.__db = None
+        self.__db_entries = 0
+        if(db_path):
+            self.__db = sqlite3.connect(db_path, check_same_thread=False)
+            self.__db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created REAL NOT NULL)")
+            self.__db.execute("CREATE INDEX IF NOT EXISTS embeddings_created ON embeddings (created)")
+            self.__db.commit()
+            self.__db_entries = self.__db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model : str, text : str) -> str:
+        """Get the cache key of a text embedded with the given model.
+
+        Arguments:
+
+            `model`: The name of the embeddings model.
+            `text`: The text that gets embedded.
+
+        Returns:
+
+            The hash of the model and the normalized text."""
+
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode()).hexdigest()
+
+    def get(self, model : str, text : str) -> list[float] | None:
+        """Get a cached vector.
+
+        Arguments:
+
+            `model`: The name of the embeddings model.
+            `text`: The text that got embedded.
+
+        Returns:
+
+            The cached vector or `None` if it is not cached."""
+
+        key = self.key(model, text)
+        now = time.time()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if(entry is not None):
+                if(self.__ttl is None or now - entry[0] < self.__ttl):
+                    self.__entries.move_to_end(key)
+                    self.__counters["hits"] += 1
+                    self.__counters["memory_hits"] += 1
+                    count("cache_lookups", cache="embedding", result="hit")
+                    return entry[1].tolist()
+                del self.__entries[key]
+
+            if(self.__db is not None):
+                row = self.__db.execute("SELECT vector, created FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if(row is not None):
+                    if(self.__ttl is None or now - row[1] < self.__ttl):
+                        vector = array("f", row[0])
+                        self.__remember(key, row[1], vector)
+                        self.__counters["hits"] += 1
+                        self.__counters["disk_hits"] += 1
+                        count("cache_lookups", cache="embedding", result="hit")
+                        return vector.tolist()
+                    self.__db.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+                    self.__db.commit()
+
+            self.__counters["misses"] += 1
+            count("cache_lookups", cache="embedding", result="miss")
+            return None
+
+    def set(self, model : str, text : str, vector : list[float]) -> None:
+        """Add a vector to the cache.
+
+        Arguments:
+
+            `model`: The name of the embeddings model.
+            `text`: The text that got embedded.
+            `vector`: The embedding vector of the text."""
+
+        self.set_many(model, [text], [vector])
+
+    def set_many(self, model : str, texts : Sequence[str], vectors : Sequence[list[float]]) -> None:
+        """Add many vectors to the cache, they are written to disk in one transaction.
+
+        Arguments:
+
+            `model`: The name of the embeddings model.
+            `texts`: The texts that got embedded.
+            `vectors`: The embedding vectors of the texts, in the same order."""
+
+        keys = [self.key(model, text) for text in texts]
+        # Vectors are kept as 32 bit floats, a list of python floats takes about eight times the memory.
+        vectors = [array("f", vector) for vector in vectors]
+        now = time.time()
+        with self.__lock:
+            for key, vector in zip(keys, vectors):
+                self.__remember(key, now, vector)
+            if(self.__db is not None):
+                self.__db.executemany("INSERT OR REPLACE INTO embeddings (key, vector, created) VALUES (?, ?, ?)", [(key, vector.tobytes(), now) for key, vector in zip(keys, vectors)])
+                self.__db_entries += len(keys)
+                # Evicting scans the oldest entries, so it only runs once the disk tier holds a sixteenth more vectors than allowed.
+                if(self.__max_db_entries is not None and self.__db_entries > self.__max_db_entries + max(1, self.__max_db_entries // 16)):
+                    self.__db.execute("DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY created DESC LIMIT -1 OFFSET ?)", (self.__max_db_entries,))
+                    self.__db_entries = self.__db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                self.__db.commit()
+
+    def record_embedding(self, amount : int, seconds : float) -> None:
+        """Record a call to the embeddings API, used to estimate the latency saved by cache hits.
+
+        Arguments:
+
+            `amount`: The amount of texts that were embedded.
+            `seconds`: The duration of the API call."""
+
+        with self.__lock:
+            self.__counters["embedded_texts"] += amount
+            self.__counters["embedding_seconds"] += seconds
+
+    def stats(self) -> dict[str, int | float]:
+        """Get the hit and miss counters of the cache.
+
+        Returns:
+
+            A dict with the `hits`, `misses`, `memory_hits`, `disk_hits`, `embedded_texts` and `embedding_seconds` counters,
+            the `hit_rate` and the estimated `saved_seconds` of embedding latency."""
+
+        with self.__lock:
+            stats = dict(self.__counters)
+            stats["entries"] = len(self.__entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        seconds_per_text = stats["embedding_seconds"] / stats["embedded_texts"] if stats["embedded_texts"] else 0.0
+        stats["saved_seconds"] = stats["hits"] * seconds_per_text
+        return stats
+
+    def clear(self) -> None:
+        """Remove all vectors from the cache."""
+
+        with self.__lock:
+            self.__entries.clear()
+            if(self.__db is not None):
+                self.__db.execute("DELETE FROM embeddings")
+                self.__db.commit()
+                self.__db_entries = 0
+
+    def __remember(self, key : str, created : float, vector : array) -> None:
+        self.__entries[key] = (created, vector)
+        self.__entries.move_to_end(key)
+        while(len(self.__entries) > self.__max_entries):
+            self.__entries.popitem(last=False)
+
+class Cached_Embeddings(Embeddings):
+    """An embeddings model that looks up every text in an `Embedding_Cache` before calling the wrapped model."""
+
+    def __init__(self, embeddings : Embeddings, cache : Embedding_Cache, model : str | None = None) -> None:
+        """An embeddings model that looks up every text in an `Embedding_Cache` before calling the wrapped model.
+
+        Arguments:
+
+            `embeddings`: The embeddings model to wrap.
+            `cache`: The cache to use.
+            `model`: The model name used in the cache keys, leave as `None` to use the model of the wrapped embeddings."""
+
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+
+    def embed_documents(self, texts : list[str]) -> list[list[float]]:
+        vectors, missing = self.__lookup(texts)
+        if(missing):
+            start = time.perf_counter()
+            embedded = self.embeddings.embed_documents([texts[i] for i in missing])
+            self.__store(texts, vectors, missing, embedded, time.perf_counter() - start)
+        return vectors
+
+    def embed_query(self, text : str) -> list[float]:
+        vector = self.cache.get(self.model, text)
+        if(vector is None):
+            start = time.perf_counter()
+            vector = self.embeddings.embed_query(text)
+            self.cache.record_embedding(1, time.perf_counter() - start)
+            self.cache.set(self.model, text, vector)
+        return vector
+
+    async def aembed_documents(self, texts : list[str]) -> list[list[float]]:
+        vectors, missing = self.__lookup(texts)
+        if(missing):
+            start = time.perf_counter()
+            embedded = await self.embeddings.aembed_documents([texts[i] for i in missing])
+            self.__store(texts, vectors, missing, embedded, time.perf_counter() - start)
+        return vectors
+
+    async def aembed_query(self, text : str) -> list[float]:
+        vector = self.cache.get(self.model, text)
+        if(vector is None):
+            start = time.perf_counter()
+            vector = await self.embeddings.aembed_query(text)
+            self.cache.record_embedding(1, time.perf_counter() - start)
+            self.cache.set(self.model, text, vector)
+        return vector
+
+    def __lookup(self, texts : list[str]) -> tuple[list[list[float] | None], list[int]]:
+        vectors = [self.cache.get(self.model, text) for text in texts]
+        return vectors, [i for i, vector in enumerate(vectors) if vector is None]
+
+    def __store(self, texts : list[str], vectors : list[list[float] | None], missing : list[int], embedded : list[list[float]], seconds : float) -> None:
+        self.cache.record_embedding(len(missing), seconds)
+        for i, vector in zip(missing, embedded):
+            vectors[i] = vector
+        self.cache.set_many(self.model, [texts[i] for i in missing], embedded)
+
+class Response_Cache():
+    """A cache for agent responses and deterministic tool results with exact and semantic matching."""
+
+    def __init__(self, max_entries : int = 1000, ttl : float | None = None, embeddings : Embeddings | None = None, semantic_accuracy : float = 0.95) -> None:
+        """A cache for agent responses and deterministic tool results with exact and semantic matching.
+        Responses are keyed by the system prompt, model and temperature of the agent, its `cache_scope` and the prompt.
+
+        Arguments:
+
+            `max_entries`: The maximum amount of responses and tool results kept, the least recently used ones are evicted first.
+            `ttl`: The amount of seconds a response stays valid, leave as `None` to keep responses until they are evicted.
+            `embeddings`: The embeddings model used to find similar prompts, like the `embeddings` of a `Vector_DB`, leave as `None` to only match exact prompts.
+            `semantic_accuracy`: The minimum amount a prompt needs to match a cached prompt to reuse its response, needs to be between `0` and `1` inclusive.
+
+        Examples:
+
+        .. code-block:: python
+            from rhythm.integrations import Agent, Response_Cache, Vector_DB
+
+            vector_db = Vector_DB(db_name=\"example\")
+            response_cache = Response_Cache(max_entries=5000, ttl=3600, embeddings=vector_db.embeddings)
+            agent = Agent(openai_model=\"gpt-3.5-turbo\", temperature=0, tools=[], system_prompt=\"You are a helpful assistant.\", max_iterations=None, debug=False, response_cache=response_cache)"""
+
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__semantic_accuracy = semantic_accuracy
+        self.__embeddings = None
+        if(embeddings is not None):
+            self.__embeddings = Cached_Embeddings(embeddings=embeddings, cache=Embedding_Cache(max_entries=max_entries))
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__counters = {"hits" : 0, "semantic_hits" : 0, "misses" : 0, "tool_hits" : 0, "tool_misses" : 0, "invalidations" : 0}
+
+    @staticmethod
+    def scope(system_prompt : str, model : str, temperature : float, context : str | None = None) -> str:
+        """Get the cache scope of an agent.
+
+        Arguments:
+
+            `system_prompt`: The system prompt of the agent.
+            `model`: The LLM model of the agent.
+            `temperature`: The temperature value of the agent.
+            `context`: Anything else the responses of the agent depend on, like the memory it recalls from, leave as `None` if they only depend on the settings.
+
+        Returns:
+
+            The hash of the agent settings."""
+
+        return hashlib.sha256(f"{model}\0{temperature}\0{system_prompt}\0{context or ''}".encode()).hexdigest()
+
+    def get(self, scope : str, prompt : str) -> str | None:
+        """Get a cached response.
+
+        Arguments:
+
+            `scope`: The cache scope of the agent.
+            `prompt`: The prompt of the user.
+
+        Returns:
+
+            The cached response or `None` if there is no matching response."""
+
+        response = self.__get_exact(("response", scope, prompt))
+        if(response is None and self.__embeddings is not None):
+            response = self.__get_similar(scope, self.__embeddings.embed_query(prompt))
+        return response
+
+    async def aget(self, scope : str, prompt : str) -> str | None:
+        """Get a cached response asynchronously.
+
+        Arguments:
+
+            `scope`: The cache scope of the agent.
+            `prompt`: The prompt of the user.
+
+        Returns:
+
+            The cached response or `None` if there is no matching response."""
+
+        response = self.__get_exact(("response", scope, prompt))
+        if(response is None and self.__embeddings is not None):
+            response = self.__get_similar(scope, await self.__embeddings.aembed_query(prompt))
+        return response
+
+    def set(self, scope : str, prompt : str, response : str) -> None:
+        """Add a response to the cache.
+
+        Arguments:
+
+            `scope`: The cache scope of the agent.
+            `prompt`: The prompt of the user.
+            `response`: The response of the agent."""
+
+        vector = self.__embeddings.embed_query(prompt) if self.__embeddings is not None else None
+        self.__set(("response", scope, prompt), response, scope, vector)
+
+    async def aset(self, scope : str, prompt : str, response : str) -> None:
+        """Add a response to the cache asynchronously.
+
+        Arguments:
+
+            `scope`: The cache scope of the agent.
+            `prompt`: The prompt of the user.
+            `response`: The response of the agent."""
+
+        vector = await self.__embeddings.aembed_query(prompt) if self.__embeddings is not None else None
+        self.__set(("response", scope, prompt), response, scope, vector)
+
+    def memoize_tool(self, tool : BaseTool) -> BaseTool:
+        """Wrap a tool so its results are cached by its arguments.
+        Only use this for tools that always give the same result for the same arguments.
+
+        Arguments:
+
+            `tool`: The tool to wrap.
+
+        Returns:
+
+            A tool with the same name, description and arguments that looks up its results in the cache."""
+
+        def run(**kwargs : Any) -> Any:
+            key = ("tool", tool.name, json.dumps(kwargs, sort_keys=True, default=str))
+            result = self.__get_tool_result(key)
+            if(result is None):
+                result = tool.run(kwargs)
+                self.__set(key, result)
+            return result
+
+        async def arun(**kwargs : Any) -> Any:
+            key = ("tool", tool.name, json.dumps(kwargs, sort_keys=True, default=str))
+            result = self.__get_tool_result(key)
+            if(result is None):
+                result = await tool.arun(kwargs)
+                self.__set(key, result)
+            return result
+
+        return StructuredTool.from_function(func=run, coroutine=arun, name=tool.name, description=tool.description, args_schema=tool.args_schema, return_direct=tool.return_direct, metadata=tool.metadata)
+
+    def invalidate(self, scope : str | None = None) -> None:
+        """Remove cached responses and tool results, call this when the information the agent relies on changes.
+
+        Arguments:
+
+            `scope`: The cache scope of the agent to remove the responses of, leave as `None` to remove every entry."""
+
+        with self.__lock:
+            if(scope is None):
+                self.__entries.clear()
+            else:
+                for key in [key for key, entry in self.__entries.items() if entry[1] == scope]:
+                    del self.__entries[key]
+            self.__counters["invalidations"] += 1
+
+    def stats(self) -> dict[str, int | float]:
+        """Get the hit and miss counters of the cache.
+
+        Returns:
+
+            A dict with the `hits`, `semantic_hits`, `misses`, `tool_hits`, `tool_misses` and `invalidations` counters and the `hit_rate` of responses."""
+
+        with self.__lock:
+            stats = dict(self.__counters)
+            stats["entries"] = len(self.__entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def __valid(self, entry : tuple) -> bool:
+        return self.__ttl is None or time.time() - entry[0] < self.__ttl
+
+    def __get_exact(self, key : tuple) -> str | None:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if(entry is not None and self.__valid(entry)):
+                self.__entries.move_to_end(key)
+                self.__counters["hits"] += 1
+                count("cache_lookups", cache="response", result="hit")
+                return entry[3]
+            if(self.__embeddings is None):
+                self.__counters["misses"] += 1
+                count("cache_lookups", cache="response", result="miss")
+            return None
+
+    def __get_similar(self, scope : str, vector : list[float]) -> str | None:
+        with self.__lock:
+            keys = [key for key, entry in self.__entries.items() if entry[1] == scope and entry[2] is not None and self.__valid(entry)]
+            if(keys):
+                scores = np.stack([self.__entries[key][2] for key in keys]) @ _normalize(vector)
+                best = int(np.argmax(scores))
+                if(scores[best] >= self.__semantic_accuracy):
+                    self.__entries.move_to_end(keys[best])
+                    self.__counters["hits"] += 1
+                    self.__counters["semantic_hits"] += 1
+                    count("cache_lookups", cache="response", result="semantic_hit")
+                    return self.__entries[keys[best]][3]
+            self.__counters["misses"] += 1
+            count("cache_lookups", cache="response", result="miss")
+            return None
+
+    def __get_tool_result(self, key : tuple) -> Any:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if(entry is not None and self.__valid(entry)):
+                self.__entries.move_to_end(key)
+                self.__counters["tool_hits"] += 1
+                count("cache_lookups", cache="tool", result="hit")
+                return entry[3]
+            self.__counters["tool_misses"] += 1
+            count("cache_lookups", cache="tool", result="miss")
+            return None
+
+    def __set(self, key : tuple, value : Any, scope : str | None = None, vector : list[float] | None = None) -> None:
+        with self.__lock:
+            self.__entries[key] = (time.time(), scope, _normalize(vector) if vector is not None else None, value)
+            self.__entries.move_to_end(key)
+            while(len(self.__entries) > self.__max_entries):
+                self.__entries.popitem(last=False)
+
+def _normalize(vector : list[float]) -> np.ndarray:
+    normalized = np.asarray(vector, dtype=np.float32)
+    return normalized / max(float(np.linalg.norm(normalized)), 1e-12)
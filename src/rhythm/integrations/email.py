@@ -2,13 +2,19 @@
 
 import os
 import ssl
-from smtplib import SMTP_SSL
+import time
+import queue
+import threading
+from smtplib import SMTP, SMTP_SSL, SMTPServerDisconnected
 from email.message import EmailMessage
+from typing import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from ..tracing import span, count
 
 class EMail():
     """An interface with EMail Servers."""
 
-    def __init__(self, smtp_server_address : str | None = None, smtp_server_port : int | None = None, sender_address : str | None = None, sender_application_password : str | None = None) -> None:
+    def __init__(self, smtp_server_address : str | None = None, smtp_server_port : int | None = None, sender_address : str | None = None, sender_application_password : str | None = None, pooled : bool = False, max_connections : int = 4, keep_alive : float = 60.0, use_ssl : bool = True) -> None:
         """An interface with EMail Servers.
 
         Arguments:
@@ -16,13 +22,17 @@ class EMail():
             `smtp_server_address`: The smpt server address of the EMail service, leave as `None` to use the enviorment variable `EMAIL_SERVER_ADDRESS`.
             `smtp_server_port`:  The smpt server port of the EMail service, leave as `None` to use the enviorment variable `EMAIL_SERVER_PORT`.
             `sender_address`: The EMail address of the EMail account, leave as `None` to use the enviorment variable `EMAIL_ADDRESS`.
-            `sender_application_password`: The application password of the EMail account, leave as `None` to use the enviorment variable `EMAIL_PASSWORD`.
-                
+            `sender_application_password`: The application password of the EMail account, leave as `None` to use the enviorment variable `EMAIL_PASSWORD`, without a password the sender does not log in.
+            `pooled`: Weather or not connections to the server are kept open and reused by `send_mail`, close them with `close` when done.
+            `max_connections`: The maximum amount of connections open to the server at the same time.
+            `keep_alive`: The amount of seconds an unused connection is reused for, older connections are replaced because servers close them.
+            `use_ssl`: Weather or not to connect with SSL, disable this for a local server without SSL.
+
         Examples:
 
             .. code-block:: python
             from rhythm.integrations import EMail
-        
+
             email = EMail()"""
 
         smtp_server_address = smtp_server_address or os.environ.get("EMAIL_SERVER_ADDRESS")
@@ -34,23 +44,141 @@ class EMail():
         self.__smpt_server_port = smtp_server_port
         self.__sender_address = sender_address
         self.__sender_application_password = sender_application_password
+        self.__pooled = pooled
+        self.__max_connections = max_connections
+        self.__keep_alive = keep_alive
+        self.__use_ssl = use_ssl
+        self.__context = None
+        self.__context_lock = threading.Lock()
+        self.__connections = queue.LifoQueue()
+        self.__connection_slots = threading.BoundedSemaphore(max_connections)
 
     def send_mail(self, reciver_address : str, subject : str, mail_text : str) -> None:
         """Send an Email to the reciver.
-        
+
         Arguments:
 
             `reciver_address`: The EMail address of the recivers EMail account.
             `subject`: The subjectline of the EMail.
             `mail_text`: The text content of the EMail."""
 
+        try:
+            self.__send(self.__mail(reciver_address, subject, mail_text))
+        finally:
+            if(not self.__pooled):
+                self.close()
+
+    def send_many(self, mails : Iterable[tuple[str, str, str]], max_parallel : int | None = None) -> list[dict[str, str | bool | None]]:
+        """Send many EMails over shared connections.
+        A mail that fails does not stop the others, its error is part of the results instead.
+
+        Arguments:
+
+            `mails`: The EMails to send, every EMail is a tuple of the reciver address, the subjectline and the text content.
+            `max_parallel`: The maximum amount of EMails sent at the same time, leave as `None` to use `max_connections`.
+
+        Returns:
+
+            A result for every EMail in the same order, with the `reciver_address`, weather or not it was `sent` and the `error` if it was not.
+
+        Examples:
+
+        .. code-block:: python
+            results = email.send_many([(\"first@gmail.com\", \"Test Message\", \"This is a test message!\"), (\"second@gmail.com\", \"Test Message\", \"This is a test message!\")])"""
+
+        def send(mail : tuple[str, str, str]) -> dict[str, str | bool | None]:
+            try:
+                self.__send(self.__mail(*mail))
+            except Exception as error:
+                return {"reciver_address" : mail[0], "sent" : False, "error" : f"{type(error).__name__}: {error}"}
+            return {"reciver_address" : mail[0], "sent" : True, "error" : None}
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(max_parallel or self.__max_connections, self.__max_connections)) as executor:
+                return list(executor.map(send, mails))
+        finally:
+            if(not self.__pooled):
+                self.close()
+
+    def close(self) -> None:
+        """Close all unused connections to the server."""
+
+        while(True):
+            try:
+                smtp, _ = self.__connections.get_nowait()
+            except queue.Empty:
+                return
+            self.__disconnect(smtp)
+
+    def __mail(self, reciver_address : str, subject : str, mail_text : str) -> EmailMessage:
         mail = EmailMessage()
         mail['From'] = self.__sender_address
         mail['to'] = reciver_address
         mail['Subject'] = subject
         mail.set_content(mail_text)
-        context = ssl.create_default_context()
-        with SMTP_SSL(self.__smpt_server_address, self.__smpt_server_port, context=context) as smtp:
-            smtp.login(self.__sender_address, self.__sender_application_password)
-            smtp.sendmail(self.__sender_address ,reciver_address, mail.as_string())
+        return mail
+
+    def __send(self, mail : EmailMessage) -> None:
+        # A reused connection may have been closed by the server, in that case the mail is sent again over a new one.
+        with span("email.send", pooled=self.__pooled) as send_span:
+            for attempt in range(2):
+                smtp, reused = self.__acquire()
+                send_span.set(reused=reused, attempts=attempt + 1)
+                try:
+                    smtp.sendmail(self.__sender_address, mail['to'], mail.as_string())
+                except (SMTPServerDisconnected, ConnectionError) as error:
+                    self.__release(smtp, broken=True)
+                    if(not reused or attempt > 0):
+                        raise error
+                    count("retries", component="email")
+                except Exception as error:
+                    self.__release(smtp, broken=False)
+                    raise error
+                else:
+                    self.__release(smtp, broken=False)
+                    return
+
+    def __acquire(self) -> tuple[SMTP, bool]:
+        self.__connection_slots.acquire()
+        try:
+            while(True):
+                try:
+                    smtp, last_used = self.__connections.get_nowait()
+                except queue.Empty:
+                    return self.__connect(), False
+                if(time.monotonic() - last_used < self.__keep_alive):
+                    return smtp, True
+                self.__disconnect(smtp)
+        except BaseException as error:
+            self.__connection_slots.release()
+            raise error
+
+    def __release(self, smtp : SMTP, broken : bool) -> None:
+        if(broken):
+            self.__disconnect(smtp)
+        else:
+            self.__connections.put((smtp, time.monotonic()))
+        self.__connection_slots.release()
+
+    def __connect(self) -> SMTP:
+        count("connections", component="email")
+        if(self.__use_ssl):
+            with self.__context_lock:
+                if(self.__context is None):
+                    self.__context = ssl.create_default_context()
+            smtp = SMTP_SSL(self.__smpt_server_address, self.__smpt_server_port, context=self.__context)
+        else:
+            smtp = SMTP(self.__smpt_server_address, self.__smpt_server_port)
+        if(self.__sender_application_password):
+            try:
+                smtp.login(self.__sender_address, self.__sender_application_password)
+            except Exception as error:
+                smtp.close()
+                raise error
+        return smtp
+
+    def __disconnect(self, smtp : SMTP) -> None:
+        try:
             smtp.quit()
+        except Exception:
+            smtp.close()
@@ -0,0 +1,475 @@
+"""A module containing the local in-process vector database."""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import threading
+import numpy as np
+from typing import Any, Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+from .cache import Embedding_Cache, Cached_Embeddings
+from .search import _words, _hybrid_rerank, _merge, _matches
+from ..tracing import span
+
+class Local_Vector_DB():
+    """A local vector database stored in a memory-mapped matrix, a drop-in replacement for `Vector_DB`."""
+
+    def __init__(self, db_name : str, db_path : str | None = None, embeddings_api_key : str | None = None, embedding_cache : Embedding_Cache | None = None, dimensions : int = 1536, embeddings : Embeddings | None = None) -> None:
+        """A local vector database stored in a memory-mapped matrix, a drop-in replacement for `Vector_DB`.
+        The vectors are kept in the file `<db_name>.f32` and the texts in the file `<db_name>.jsonl`, both inside of `db_path`.
+
+        Arguments:
+
+            `db_name`: The name of the database.
+            `db_path`: The folder to store the database in, leave as `None` to use the enviorment variable `LOCAL_DATABASE_PATH` or the current folder.
+            `embeddings_api_key`: The openai API key, leave as `None` to use the enviorment variable `OPENAI_API_KEY`.
+            `embedding_cache`: The cache to look up embeddings in before calling the embeddings API, leave as `None` to embed every text.
+            `dimensions`: The size of the embedding vectors.
+            `embeddings`: The embeddings model to use, share one between databases to share its connections, leave as `None` to create an openai embeddings model.
+
+        Examples:
+
+        .. code-block:: python
+            from rhythm.integrations import Local_Vector_DB
+
+            vector_db = Local_Vector_DB(db_name=\"example\", db_path=\"./memory\")"""
+
+        db_path = db_path or os.environ.get("LOCAL_DATABASE_PATH") or "."
+        embeddings_api_key = embeddings_api_key or os.environ.get("OPENAI_API_KEY")
+
+        os.makedirs(db_path, exist_ok=True)
+        self.__db_name = db_name
+        self.__dimensions = dimensions
+        self.__vectors_file = os.path.join(db_path, f"{db_name}.f32")
+        self.__payloads_file = os.path.join(db_path, f"{db_name}.jsonl")
+        self.__text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+        self.__embeddings = embeddings or OpenAIEmbeddings(api_key=embeddings_api_key)
+        if(embedding_cache is not None):
+            self.__embeddings = Cached_Embeddings(embeddings=self.__embeddings, cache=embedding_cache)
+        self.__lock = threading.RLock()
+        self.__write_hooks = []
+        self.__load()
+
+    @property
+    def db_name(self) -> str:
+        """The name of the database."""
+
+        return self.__db_name
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """The embeddings model of the database, including its embedding cache."""
+
+        return self.__embeddings
+
+    def add_write_hook(self, hook : Callable[[], None]) -> None:
+        """Add a function that is called every time entries are added to the database or it is reset, for example to invalidate a `Response_Cache`.
+
+        Arguments:
+
+            `hook`: The function to call."""
+
+        self.__write_hooks.append(hook)
+
+    def add_to_db(self, text: str, metadata : dict[str, Any] | None = None, duplicate_threshold : float | None = None) -> int:
+        """Add an entry to the database.
+
+        Arguments:
+
+            `text`: The text to add to the database.
+            `metadata`: The fields stored with the entry to filter by, the `timestamp` is set to the current time if it is not given.
+            `duplicate_threshold`: The score above which a chunk counts as a duplicate of an existing entry of the same tenant and is not added, leave as `None` to add every chunk.
+
+        Returns:
+
+            The amount of chunks added to the database."""
+
+        with span("vector_db.add", db=self.__db_name, backend="local") as add_span:
+            docs, ids, metadatas = self.__split(text, metadata)
+            if(not docs):
+                return 0
+            added = self.__write(ids, docs, metadatas, self.__embeddings.embed_documents(docs), duplicate_threshold)
+            add_span.set(chunks=added, skipped=len(docs) - added)
+            return added
+
+    async def aadd_to_db(self, text: str, metadata : dict[str, Any] | None = None, duplicate_threshold : float | None = None) -> int:
+        """Add an entry to the database asynchronously.
+
+        Arguments:
+
+            `text`: The text to add to the database.
+            `metadata`: The fields stored with the entry to filter by, the `timestamp` is set to the current time if it is not given.
+            `duplicate_threshold`: The score above which a chunk counts as a duplicate of an existing entry of the same tenant and is not added, leave as `None` to add every chunk.
+
+        Returns:
+
+            The amount of chunks added to the database."""
+
+        with span("vector_db.add", db=self.__db_name, backend="local") as add_span:
+            docs, ids, metadatas = self.__split(text, metadata)
+            if(not docs):
+                return 0
+            vectors = await self.__embeddings.aembed_documents(docs)
+            added = await asyncio.to_thread(self.__write, ids, docs, metadatas, vectors, duplicate_threshold)
+            add_span.set(chunks=added, skipped=len(docs) - added)
+            return added
+
+    def add_many(self, texts : Iterable[str | tuple[str, dict[str, Any]]], batch_size : int = 64, max_in_flight : int = 4, skip_existing : bool = False, progress : Callable[[int, int], None] | None = None) -> int:
+        """Add many entries to the database in batches.
+        The texts are streamed through the text splitter and the chunks are embedded in batches, while at most `max_in_flight` batches are embedded at the same time.
+        Every chunk gets a point ID derived from its text, so adding the same text again overwrites the existing points instead of duplicating them.
+
+        Arguments:
+
+            `texts`: The texts to add to the database, or tuples of a text and its metadata, can be any iterable including generators.
+            `batch_size`: The amount of chunks embedded per request.
+            `max_in_flight`: The maximum amount of batches embedded at the same time.
+            `skip_existing`: Weather or not chunks that are already in the database should be skipped without embedding them, use this to resume an interrupted ingestion.
+            `progress`: A function called after every finished batch with the amount of texts read and the amount of chunks added so far.
+
+        Returns:
+
+            The amount of chunks added to the database."""
+
+        counts = {"texts" : 0, "chunks" : 0}
+
+        def embed(batch : list[tuple[str, str, dict[str, Any]]]) -> tuple[list[tuple[str, str, dict[str, Any]]], list[list[float]]]:
+            return batch, self.__embeddings.embed_documents([doc for _, doc, _ in batch])
+
+        def batches() -> Iterable[list[tuple[str, str, dict[str, Any]]]]:
+            batch = []
+            for text in texts:
+                docs, ids, metadatas = self.__split(*text) if isinstance(text, tuple) else self.__split(text)
+                counts["texts"] += 1
+                batch.extend(chunk for chunk in zip(ids, docs, metadatas) if not (skip_existing and chunk[0] in self.__rows))
+                while(len(batch) >= batch_size):
+                    yield batch[:batch_size]
+                    batch = batch[batch_size:]
+            if(batch):
+                yield batch
+
+        with span("vector_db.add_many", db=self.__db_name, backend="local") as add_span:
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                pending = []
+                for batch in batches():
+                    pending.append(executor.submit(embed, batch))
+                    while(len(pending) >= max_in_flight or (pending and pending[0].done())):
+                        self.__finish(pending.pop(0).result(), counts, progress)
+                for future in pending:
+                    self.__finish(future.result(), counts, progress)
+            add_span.set(texts=counts["texts"], chunks=counts["chunks"])
+
+        return counts["chunks"]
+
+    def get_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[str]:
+        """Query the database.
+
+        Arguments:
+
+            `query`: The text query for the database.
+            `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
+            `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
+
+        Returns:
+
+            A list of matching entries in the database."""
+
+        return [text for text, _ in self.get_scored_from_db(query, max_amount, accuracy, filters, hybrid)]
+
+    def get_scored_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[tuple[str, float]]:
+        """Query the database and get the score of every entry.
+
+        Arguments:
+
+            `query`: The text query for the database.
+            `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
+            `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
+
+        Returns:
+
+            A list of matching entries in the database with their score, the best match first."""
+
+        with span("vector_db.search", db=self.__db_name, backend="local", hybrid=hybrid, filtered=bool(filters)) as search_span:
+            with span("vector_db.embed", db=self.__db_name):
+                query_vector = self.__embeddings.embed_query(query)
+            results = self.__search(query_vector, query, max_amount, accuracy, filters, hybrid)
+            search_span.set(results=len(results))
+            return results
+
+    async def aget_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[str]:
+        """Query the database asynchronously.
+
+        Arguments:
+
+            `query`: The text query for the database.
+            `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
+            `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
+
+        Returns:
+
+            A list of matching entries in the database."""
+
+        return [text for text, _ in await self.aget_scored_from_db(query, max_amount, accuracy, filters, hybrid)]
+
+    async def aget_scored_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[tuple[str, float]]:
+        """Query the database asynchronously and get the score of every entry.
+
+        Arguments:
+
+            `query`: The text query for the database.
+            `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
+            `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
+
+        Returns:
+
+            A list of matching entries in the database with their score, the best match first."""
+
+        with span("vector_db.search", db=self.__db_name, backend="local", hybrid=hybrid, filtered=bool(filters)) as search_span:
+            with span("vector_db.embed", db=self.__db_name):
+                query_vector = await self.__embeddings.aembed_query(query)
+            results = self.__search(query_vector, query, max_amount, accuracy, filters, hybrid)
+            search_span.set(results=len(results))
+            return results
+
+    def reset_db(self) -> None:
+        """Reset the database."""
+
+        with self.__lock:
+            for file in (self.__vectors_file, self.__payloads_file):
+                if(os.path.exists(file)):
+                    os.remove(file)
+            self.__load()
+        self.__written()
+
+    def create_db(self) -> None:
+        """Create the database if it does not exist yet, the files of a local database are created with it."""
+
+    async def areset_db(self) -> None:
+        """Reset the database asynchronously."""
+
+        await asyncio.to_thread(self.reset_db)
+
+    def compact(self, similarity : float = 0.95, max_age : float | None = None, filters : dict[str, Any] | None = None, batch_size : int = 256) -> dict[str, int | float]:
+        """Remove near duplicate and stale entries from the database and rewrite its files without them.
+        Every cluster of entries of the same tenant scoring at least `similarity` with each other is merged into its newest entry, the older ones are deleted.
+
+        Arguments:
+
+            `similarity`: The minimum score two entries need to count as duplicates, needs to be between `0` and `1` inclusive.
+            `max_age`: The amount of seconds after which an entry is stale and deleted, leave as `None` to keep old entries.
+            `filters`: The metadata fields the compacted entries need to match, in the same format as for `get_from_db`, leave as `None` to compact all entries.
+            `batch_size`: The amount of entries compared at the same time.
+
+        Returns:
+
+            A report with the amount of entries `before` and `after`, the amount of `duplicates` and `stale` entries removed and the mean seconds a recall took `latency_before` and `latency_after`."""
+
+        with span("vector_db.compact", db=self.__db_name, backend="local") as compact_span:
+            with self.__lock:
+                count = len(self.__payloads)
+                rows = self.__filter(filters, count)
+                oldest = time.time() - max_age if max_age is not None else None
+                timestamps = np.array([(self.__payloads[row].get("metadata") or {}).get("timestamp", np.nan) for row in rows], dtype=np.float64)
+                stale = rows[timestamps < oldest] if oldest is not None else rows[:0]
+                timestamps = np.nan_to_num(timestamps, nan=0.0)
+                fresh = rows[np.argsort(-timestamps, kind="stable")]
+                fresh = fresh[~np.isin(fresh, stale)]
+                samples = np.array(self.__vectors[fresh[::max(1, len(fresh) // 20)][:20]])
+                latency_before = self.__recall_latency(samples, filters)
+                tenants = np.array([(self.__payloads[row].get("metadata") or {}).get("tenant") for row in range(count)], dtype=object)
+                # The newest entries are visited first, so every entry that matches an entry kept before it is an older duplicate.
+                kept = np.zeros(0, dtype=np.int64)
+                removed = [stale]
+                for start in range(0, len(fresh), batch_size):
+                    batch = fresh[start:start + batch_size]
+                    duplicate = self.__has_duplicate(batch, kept, tenants, similarity)
+                    inner = self.__vectors[batch] @ self.__vectors[batch].T
+                    new = []
+                    for i, row in enumerate(batch):
+                        if(duplicate[i] or any(inner[i, j] >= similarity and tenants[batch[j]] == tenants[row] for j in new)):
+                            removed.append(np.array([row], dtype=np.int64))
+                        else:
+                            new.append(i)
+                    kept = np.concatenate([kept, batch[new]])
+                removed = np.concatenate(removed)
+                if(len(removed)):
+                    self.__rewrite(np.setdiff1d(np.arange(count), removed))
+                latency_after = self.__recall_latency(samples, filters)
+            if(len(removed)):
+                self.__written()
+            report = {"before" : count, "after" : count - len(removed), "duplicates" : len(removed) - len(stale), "stale" : len(stale), "latency_before" : latency_before, "latency_after" : latency_after}
+            compact_span.set(**report)
+            return report
+
+    def __load(self) -> None:
+        self.__payloads = []
+        self.__rows = {}
+        self.__postings = {}
+        if(os.path.exists(self.__payloads_file)):
+            with open(self.__payloads_file, "r") as reader:
+                for line in reader:
+                    payload = json.loads(line)
+                    # Entries written again are appended again, the last line of an ID holds its current payload.
+                    row = self.__rows.setdefault(payload["id"], len(self.__payloads))
+                    if(row == len(self.__payloads)):
+                        self.__payloads.append(payload)
+                    else:
+                        self.__payloads[row] = payload
+            for row, payload in enumerate(self.__payloads):
+                self.__index(payload, row)
+        capacity = max(os.path.getsize(self.__vectors_file) // (4 * self.__dimensions), len(self.__payloads)) if os.path.exists(self.__vectors_file) else 0
+        self.__resize(max(capacity, 64))
+
+    def __resize(self, capacity : int) -> None:
+        with open(self.__vectors_file, "ab") as file:
+            file.truncate(capacity * self.__dimensions * 4)
+        self.__vectors = np.memmap(self.__vectors_file, dtype=np.float32, mode="r+", shape=(capacity, self.__dimensions))
+
+    def __split(self, text : str, metadata : dict[str, Any] | None = None) -> tuple[list[str], list[str], list[dict[str, Any]]]:
+        docs = self.__text_splitter.split_text(text)
+        metadata = dict(metadata or {})
+        metadata.setdefault("timestamp", time.time())
+        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        prefix = f"{self.__db_name}/{metadata['tenant']}" if metadata.get("tenant") is not None else self.__db_name
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{prefix}/{text_hash}/{i}")) for i in range(len(docs))]
+        return docs, ids, [dict(metadata) for _ in docs]
+
+    def __finish(self, embedded : tuple[list[tuple[str, str, dict[str, Any]]], list[list[float]]], counts : dict[str, int], progress : Callable[[int, int], None] | None) -> None:
+        batch, vectors = embedded
+        self.__write([point_id for point_id, _, _ in batch], [doc for _, doc, _ in batch], [metadata for _, _, metadata in batch], vectors)
+        counts["chunks"] += len(batch)
+        if(progress is not None):
+            progress(counts["texts"], counts["chunks"])
+
+    def __write(self, ids : list[str], docs : list[str], metadatas : list[dict[str, Any]], vectors : list[list[float]], duplicate_threshold : float | None = None) -> int:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        written = 0
+        with self.__lock:
+            appended = []
+            for point_id, doc, metadata, vector in zip(ids, docs, metadatas, matrix):
+                if(duplicate_threshold is not None and self.__is_duplicate(vector, metadata, duplicate_threshold)):
+                    continue
+                written += 1
+                payload = {"id" : point_id, "page_content" : doc, "metadata" : metadata}
+                row = self.__rows.get(point_id)
+                if(row is None):
+                    row = len(self.__payloads)
+                    if(row >= self.__vectors.shape[0]):
+                        self.__vectors.flush()
+                        self.__resize(2 * self.__vectors.shape[0])
+                    self.__rows[point_id] = row
+                    self.__payloads.append(payload)
+                else:
+                    # Like a qdrant upsert, an entry written again replaces the stored payload, including its timestamp.
+                    self.__unindex(self.__payloads[row], row)
+                    self.__payloads[row] = payload
+                self.__index(payload, row)
+                appended.append(payload)
+                self.__vectors[row] = vector
+            self.__vectors.flush()
+            with open(self.__payloads_file, "a") as writer:
+                for payload in appended:
+                    writer.write(json.dumps(payload) + "\n")
+        if(written):
+            self.__written()
+        return written
+
+    def __is_duplicate(self, vector : np.ndarray, metadata : dict[str, Any], duplicate_threshold : float) -> bool:
+        rows = self.__filter({"tenant" : metadata["tenant"]} if metadata.get("tenant") is not None else None, len(self.__payloads))
+        return bool(len(rows)) and float(np.max(self.__vectors[rows] @ vector)) >= duplicate_threshold
+
+    def __has_duplicate(self, batch : np.ndarray, kept : np.ndarray, tenants : np.ndarray, similarity : float) -> np.ndarray:
+        duplicate = np.zeros(len(batch), dtype=bool)
+        # The kept entries are compared in blocks, so the score matrix stays small on large databases.
+        for start in range(0, len(kept), 65536):
+            block = kept[start:start + 65536]
+            matches = (self.__vectors[batch] @ self.__vectors[block].T >= similarity) & (tenants[batch][:, None] == tenants[block][None, :])
+            duplicate |= matches.any(axis=1)
+        return duplicate
+
+    def __rewrite(self, rows : np.ndarray) -> None:
+        vectors = np.array(self.__vectors[rows])
+        with open(f"{self.__payloads_file}.tmp", "w") as writer:
+            for row in rows:
+                writer.write(json.dumps(self.__payloads[row]) + "\n")
+        vectors.tofile(f"{self.__vectors_file}.tmp")
+        del self.__vectors
+        os.replace(f"{self.__vectors_file}.tmp", self.__vectors_file)
+        os.replace(f"{self.__payloads_file}.tmp", self.__payloads_file)
+        self.__load()
+
+    def __recall_latency(self, vectors : np.ndarray, filters : dict[str, Any] | None) -> float:
+        if(not len(vectors)):
+            return 0.0
+        started = time.perf_counter()
+        for vector in vectors:
+            self.__search(vector, "", 10, -1.0, filters, False)
+        return (time.perf_counter() - started) / len(vectors)
+
+    def __search(self, query_vector : list[float], query : str, max_amount : int, accuracy : float, filters : dict[str, Any] | None, hybrid : bool) -> list[tuple[str, float]]:
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        # Searches hold the lock too, as compacting and growing the database replace the vectors, payloads and postings.
+        with self.__lock:
+            count = len(self.__payloads)
+            if(count == 0 or max_amount <= 0):
+                return []
+            scores = self.__vectors[:count] @ vector
+            rows = self.__filter(filters, count)
+            if(not hybrid):
+                return [(text, score) for text, score in self.__top(scores, rows, max_amount) if score >= accuracy]
+            words = _words(query)
+            keyword_rows = np.fromiter((row for row in rows if words & _words(self.__payloads[row]["page_content"])), dtype=np.int64)
+            merged = _merge(self.__top(scores, rows, 3 * max_amount), self.__top(scores, keyword_rows, 3 * max_amount))
+        return [(text, score) for text, score in _hybrid_rerank(query, merged, max_amount) if score >= accuracy]
+
+    def __index(self, payload : dict[str, Any], row : int) -> None:
+        # Rows are listed by their text metadata values, so filters on fields like the tenant only check the rows of that value.
+        for key, value in (payload.get("metadata") or {}).items():
+            if(isinstance(value, str)):
+                self.__postings.setdefault((key, value), []).append(row)
+
+    def __unindex(self, payload : dict[str, Any], row : int) -> None:
+        for key, value in (payload.get("metadata") or {}).items():
+            if(isinstance(value, str)):
+                self.__postings[(key, value)].remove(row)
+
+    def __filter(self, filters : dict[str, Any] | None, count : int) -> np.ndarray:
+        if(not filters):
+            return np.arange(count)
+        candidates = None
+        for key, value in filters.items():
+            values = [value] if isinstance(value, str) else value if isinstance(value, list) and all(isinstance(item, str) for item in value) else None
+            if(values is not None):
+                postings = [row for item in values for row in self.__postings.get((key, item), [])]
+                if(candidates is None or len(postings) < len(candidates)):
+                    candidates = postings
+        candidates = range(count) if candidates is None else sorted(candidates)
+        return np.fromiter((row for row in candidates if row < count and _matches(self.__payloads[row].get("metadata") or {}, filters)), dtype=np.int64)
+
+    def __top(self, scores : np.ndarray, rows : np.ndarray, amount : int) -> list[tuple[str, float]]:
+        amount = min(amount, len(rows))
+        if(amount <= 0):
+            return []
+        top = rows[np.argpartition(-scores[rows], amount - 1)[:amount]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.__payloads[row]["page_content"], float(scores[row])) for row in top]
+
+    def __written(self) -> None:
+        for hook in self.__write_hooks:
+            hook()
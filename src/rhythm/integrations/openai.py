@@ -1,22 +1,384 @@
 """A module containing all OpenAI API integrations."""
 
+import io
 import os
 import base64
+import asyncio
+import weakref
+import tiktoken
+import threading
+import contextvars
+from collections import OrderedDict
 from openai import OpenAI
 from langchain.chat_models import ChatOpenAI
-from langchain_core.tools import BaseTool
-from typing import Sequence
+from langchain_core.tools import BaseTool, StructuredTool
+from typing import Any, AsyncIterator, BinaryIO, Callable, Iterator, Sequence
 from typing_extensions import Literal
-from langchain.agents import AgentExecutor, tool
+from langchain.agents import AgentExecutor, tool as langchain_tool
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.tools.render import format_tool_to_openai_function
-from langchain.agents.format_scratchpad import format_to_openai_function_messages
-from langchain.agents.output_parsers import OpenAIFunctionsAgentOutputParser
+from langchain.callbacks import get_openai_callback
+from langchain_core.language_models import BaseChatModel
+from langchain_core.callbacks import AsyncCallbackHandler, BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain.tools.render import format_tool_to_openai_tool
+from langchain.agents.format_scratchpad.openai_tools import format_to_openai_tool_messages
+from langchain.agents.output_parsers.openai_tools import OpenAIToolsAgentOutputParser
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from .cache import Response_Cache
+from ..tracing import Tracer, span, get_tracer
+
+def tool(*args : Any, deterministic : bool = False, **kwargs : Any) -> BaseTool | Callable[[Callable], BaseTool]:
+    """Create a tool from a function, works like the langchain `tool` decorator.
+
+    Arguments:
+
+        `deterministic`: Weather or not the tool always gives the same result for the same arguments, the results of deterministic tools are cached by agents with a `Response_Cache`.
+
+    Examples:
+
+    .. code-block:: python
+        from rhythm.integrations import tool
+
+        @tool(deterministic=True)
+        def add_numbers(number1 : float, number2 : float) -> float:
+            \"\"\"A tool to add two numbers, gives back the result.\"\"\"
+            return number1 + number2"""
+
+    def mark(created : BaseTool) -> BaseTool:
+        if(deterministic):
+            created.metadata = {**(created.metadata or {}), "deterministic" : True}
+        return created
+
+    created = langchain_tool(*args, **kwargs)
+    if(isinstance(created, BaseTool)):
+        return mark(created)
+    return lambda func: mark(created(func))
+
+_tool_functions = OrderedDict()
+
+def _format_tools(tools : Sequence[BaseTool]) -> list[dict]:
+    """Format tools as openai tools, reusing the schemas of tools with the same name, description and arguments."""
+
+    functions = []
+    for t in tools:
+        key = (t.name, t.description, t.args_schema)
+        function = _tool_functions.get(key)
+        if(function is None):
+            function = format_tool_to_openai_tool(t)
+            _tool_functions[key] = function
+            if(len(_tool_functions) > 1024):
+                _tool_functions.popitem(last=False)
+        functions.append(function)
+    return functions
+
+_loop = None
+_loop_lock = threading.Lock()
+_tool_threads = ThreadPoolExecutor(max_workers=64, thread_name_prefix="rhythm-tools")
+
+def set_tool_threads(max_threads : int) -> None:
+    """Set the maximum amount of sync tools running at the same time for agents executed with `Agent.execute`.
+    Their tool calls run on a shared background event loop, which runs sync tools in these threads, 64 by default.
+
+    Arguments:
+
+        `max_threads`: The maximum amount of threads, at least the amount of synchronously executed agents times the tools each one calls at the same time.
+
+    Examples:
+
+    .. code-block:: python
+        from rhythm.integrations import set_tool_threads
+
+        set_tool_threads(256)"""
+
+    global _tool_threads
+    with _loop_lock:
+        previous, _tool_threads = _tool_threads, ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="rhythm-tools")
+        if(_loop is not None):
+            _loop.call_soon_threadsafe(_loop.set_default_executor, _tool_threads)
+    previous.shutdown(wait=False)
+
+def _run_sync(coroutine : Any) -> Any:
+    """Run a coroutine on a background event loop and wait for its result, so sync callers can run tools concurrently.
+    The coroutine runs with the context variables of the caller, so an active trace continues on the loop."""
+
+    global _loop
+    with _loop_lock:
+        if(_loop is None):
+            _loop = asyncio.new_event_loop()
+            # Sync tools run in the default executor of the loop, a sized pool instead of the small one asyncio would create.
+            _loop.set_default_executor(_tool_threads)
+            threading.Thread(target=_loop.run_forever, name="rhythm-agents", daemon=True).start()
+    context = contextvars.copy_context()
+
+    async def run() -> Any:
+        for variable, value in context.items():
+            variable.set(value)
+        return await coroutine
+
+    return asyncio.run_coroutine_threadsafe(run(), _loop).result()
+
+def _streamed(llm : Runnable) -> Runnable:
+    """Call a chat model through its stream, so its tokens reach the callbacks as they arrive, and merge the chunks into one message."""
+
+    def stream(messages : Any, config : RunnableConfig) -> BaseMessage:
+        message = None
+        for chunk in llm.stream(messages, config):
+            message = chunk if message is None else message + chunk
+        return message
+
+    async def astream(messages : Any, config : RunnableConfig) -> BaseMessage:
+        message = None
+        async for chunk in llm.astream(messages, config):
+            message = chunk if message is None else message + chunk
+        return message
+
+    return RunnableLambda(stream, afunc=astream)
+
+class _Stream_Handler(AsyncCallbackHandler):
+    """Put the tokens and tool calls of an agent run into a queue as events."""
+
+    def __init__(self, queue : asyncio.Queue) -> None:
+        self.__queue = queue
+        self.__tools = {}
+
+    async def on_llm_new_token(self, token : str, **kwargs : Any) -> None:
+        if(token):
+            self.__queue.put_nowait({"type" : "token", "content" : token})
+
+    async def on_tool_start(self, serialized : dict[str, Any], input_str : str, *, run_id : Any, **kwargs : Any) -> None:
+        self.__tools[run_id] = serialized.get("name")
+        self.__queue.put_nowait({"type" : "tool_start", "tool" : self.__tools[run_id], "input" : input_str})
+
+    async def on_tool_end(self, output : Any, *, run_id : Any, **kwargs : Any) -> None:
+        self.__queue.put_nowait({"type" : "tool_end", "tool" : self.__tools.pop(run_id, None), "output" : str(output)})
+
+    async def on_tool_error(self, error : BaseException, *, run_id : Any, **kwargs : Any) -> None:
+        self.__queue.put_nowait({"type" : "tool_end", "tool" : self.__tools.pop(run_id, None), "output" : f"{type(error).__name__}: {error}"})
+
+class _Trace_Handler(BaseCallbackHandler):
+    """Record the LLM calls and tool calls of an agent run as spans of a tracer and count the tokens used."""
+
+    run_inline = True
+
+    def __init__(self, tracer : Tracer) -> None:
+        self.__tracer = tracer
+        self.__spans = {}
+
+    def on_chat_model_start(self, serialized : dict[str, Any], messages : list[list[BaseMessage]], *, run_id : Any, **kwargs : Any) -> None:
+        self.__start_llm(serialized, run_id, kwargs)
+
+    def on_llm_start(self, serialized : dict[str, Any], prompts : list[str], *, run_id : Any, **kwargs : Any) -> None:
+        self.__start_llm(serialized, run_id, kwargs)
+
+    def on_llm_end(self, response : LLMResult, *, run_id : Any, **kwargs : Any) -> None:
+        llm_span = self.__spans.pop(run_id, None)
+        if(llm_span is None):
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        for kind in ("prompt", "completion"):
+            if(usage.get(f"{kind}_tokens")):
+                self.__tracer.count("llm_tokens", usage[f"{kind}_tokens"], model=llm_span.attributes["model"], type=kind)
+        llm_span.set(tokens=usage.get("total_tokens", 0))
+        llm_span.end()
+
+    def on_llm_error(self, error : BaseException, *, run_id : Any, **kwargs : Any) -> None:
+        self.__end(run_id, error)
+
+    def on_tool_start(self, serialized : dict[str, Any], input_str : str, *, run_id : Any, **kwargs : Any) -> None:
+        self.__spans[run_id] = self.__tracer.start_span("agent.tool", tool=serialized.get("name"))
+
+    def on_tool_end(self, output : Any, *, run_id : Any, **kwargs : Any) -> None:
+        self.__end(run_id, None)
+
+    def on_tool_error(self, error : BaseException, *, run_id : Any, **kwargs : Any) -> None:
+        self.__end(run_id, error)
+
+    def __start_llm(self, serialized : dict[str, Any], run_id : Any, kwargs : dict[str, Any]) -> None:
+        parameters = kwargs.get("invocation_params") or {}
+        model = parameters.get("model_name") or parameters.get("model") or (serialized.get("id") or ["llm"])[-1]
+        self.__spans[run_id] = self.__tracer.start_span("agent.llm", model=model)
+
+    def __end(self, run_id : Any, error : BaseException | None) -> None:
+        ended = self.__spans.pop(run_id, None)
+        if(ended is not None):
+            ended.end(error)
+
+def _trace_config() -> RunnableConfig | None:
+    """Get the config that records an agent run with the current tracer, or `None` while tracing is off."""
+
+    tracer = get_tracer()
+    if(tracer is None):
+        return None
+    return {"callbacks" : [_Trace_Handler(tracer)]}
+
+def _in_background_loop() -> bool:
+    """Check if the caller already runs on the background event loop, so it must not wait for it."""
+
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+class Session():
+    """A conversation with an agent that keeps the history within a token budget."""
+
+    def __init__(self, max_tokens : int = 2000, strategy : Literal["window", "summary"] = "window", openai_model : str = "gpt-3.5-turbo", openai_api_key : str | None = None) -> None:
+        """A conversation with an agent that keeps the history within a token budget.
+
+        Arguments:
+
+            `max_tokens`: The maximum amount of tokens of the history sent with every prompt.
+            `strategy`: What happens to messages that exceed the budget, needs to be one of: `'window'` to drop the oldest turns, each prompt with its answer, `'summary'` to merge them into a rolling summary.
+            `openai_model`: The LLM model used to write the summary and count tokens.
+            `openai_api_key`: The openai API key, leave as `None` to use the enviorment variable `OPENAI_API_KEY`.
+
+        Examples:
+
+        .. code-block:: python
+            from rhythm.integrations import Session
+
+            session = Session(max_tokens=1500, strategy="summary")"""
+
+        openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
+
+        self.__max_tokens = max_tokens
+        self.__strategy = strategy
+        self.__openai_model = openai_model
+        self.__openai_api_key = openai_api_key
+        self.__summary_llm = None
+        self.__encoding = None
+        self.__encoding_loaded = False
+        self.__messages = []
+        self.__summary = ""
+        self.__summary_tokens = 0
+        self.__unsummarized = []
+        self.turns = []
+
+    @property
+    def history_tokens(self) -> int:
+        """The amount of tokens the history currently uses."""
+
+        return self.__summary_tokens + sum(tokens for _, tokens in self.__messages)
+
+    @property
+    def total_tokens(self) -> int:
+        """The amount of tokens used by all turns of the session."""
+
+        return sum(turn["total_tokens"] for turn in self.turns)
+
+    def messages(self) -> list[BaseMessage]:
+        """Get the history to send with the next prompt.
+
+        Returns:
+
+            The summary of older messages, if there is one, followed by the recent messages."""
+
+        history = [message for message, _ in self.__messages]
+        if(self.__summary):
+            history.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{self.__summary}"))
+        return history
+
+    def add_turn(self, prompt : str, output : str, prompt_tokens : int = 0, completion_tokens : int = 0) -> None:
+        """Add a finished turn to the history and shrink the history to the token budget.
+
+        Arguments:
+
+            `prompt`: The prompt of the user.
+            `output`: The output of the agent.
+            `prompt_tokens`: The amount of prompt tokens the turn used.
+            `completion_tokens`: The amount of completion tokens the turn used."""
+
+        dropped = self.__append(prompt, output)
+        summary_tokens = self.__summarize(dropped) if dropped and self.__strategy == "summary" else 0
+        self.__record(prompt_tokens, completion_tokens, summary_tokens)
+
+    async def aadd_turn(self, prompt : str, output : str, prompt_tokens : int = 0, completion_tokens : int = 0) -> None:
+        """Add a finished turn to the history and shrink the history to the token budget asynchronously.
+
+        Arguments:
+
+            `prompt`: The prompt of the user.
+            `output`: The output of the agent.
+            `prompt_tokens`: The amount of prompt tokens the turn used.
+            `completion_tokens`: The amount of completion tokens the turn used."""
+
+        dropped = self.__append(prompt, output)
+        summary_tokens = await self.__asummarize(dropped) if dropped and self.__strategy == "summary" else 0
+        self.__record(prompt_tokens, completion_tokens, summary_tokens)
+
+    def clear(self) -> None:
+        """Remove the history and the turns of the session."""
+
+        self.__messages = []
+        self.__summary = ""
+        self.__summary_tokens = 0
+        self.__unsummarized = []
+        self.turns = []
+
+    def __count(self, text : str) -> int:
+        if(not self.__encoding_loaded):
+            self.__load_encoding()
+        if(self.__encoding is None):
+            return len(text) // 4 + 4
+        return len(self.__encoding.encode(text)) + 4
+
+    def __load_encoding(self) -> None:
+        # The encoding is only loaded for the first turn, so creating a session stays cheap.
+        try:
+            self.__encoding = tiktoken.encoding_for_model(self.__openai_model)
+        except KeyError:
+            self.__encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            # tiktoken downloads its encodings on first use, without them tokens are estimated from the length.
+            self.__encoding = None
+        self.__encoding_loaded = True
+
+    def __append(self, prompt : str, output : str) -> list[BaseMessage]:
+        self.__messages.append((HumanMessage(content=prompt), self.__count(prompt)))
+        self.__messages.append((AIMessage(content=output), self.__count(output)))
+        # Turns dropped to make room for the last summary are summarised together with the ones dropped now.
+        dropped, self.__unsummarized = self.__unsummarized, []
+        self.__drop_turns(dropped)
+        return dropped
+
+    def __drop_turns(self, dropped : list[BaseMessage]) -> None:
+        # Whole turns are dropped, so the history never starts with an answer to a prompt that is gone.
+        while(self.__messages and self.history_tokens > self.__max_tokens):
+            dropped.extend(message for message, _ in self.__messages[:2])
+            del self.__messages[:2]
+
+    def __summary_messages(self, dropped : list[BaseMessage]) -> list[BaseMessage]:
+        if(self.__summary_llm is None):
+            self.__summary_llm = ChatOpenAI(model=self.__openai_model, temperature=0, api_key=self.__openai_api_key)
+        lines = "\n".join(f"{'User' if isinstance(message, HumanMessage) else 'Assistant'}: {message.content}" for message in dropped)
+        return [
+            SystemMessage(content=f"Keep a short summary of a conversation. Only keep facts that may matter later. Answer with the summary only, in at most {self.__max_tokens // 4} tokens."),
+            HumanMessage(content=f"Current summary:\n{self.__summary}\n\nNew lines of the conversation:\n{lines}"),
+        ]
+
+    def __set_summary(self, summary : str) -> int:
+        self.__summary = summary
+        self.__summary_tokens = self.__count(summary)
+        self.__drop_turns(self.__unsummarized)
+        return self.__summary_tokens
+
+    def __summarize(self, dropped : list[BaseMessage]) -> int:
+        messages = self.__summary_messages(dropped)
+        return self.__set_summary(self.__summary_llm.invoke(messages).content)
+
+    async def __asummarize(self, dropped : list[BaseMessage]) -> int:
+        messages = self.__summary_messages(dropped)
+        return self.__set_summary((await self.__summary_llm.ainvoke(messages)).content)
+
+    def __record(self, prompt_tokens : int, completion_tokens : int, summary_tokens : int) -> None:
+        self.turns.append({"prompt_tokens" : prompt_tokens, "completion_tokens" : completion_tokens, "total_tokens" : prompt_tokens + completion_tokens, "history_tokens" : self.history_tokens, "summary_tokens" : summary_tokens})
 
 class Agent():
     """An agent model with tools."""
     
-    def __init__(self, openai_model : str, temperature : float, tools : Sequence[BaseTool], system_prompt: str, max_iterations : int | None, debug : bool, openai_api_key : str | None = None) -> None:
+    def __init__(self, openai_model : str, temperature : float, tools : Sequence[BaseTool], system_prompt: str, max_iterations : int | None, debug : bool, openai_api_key : str | None = None, response_cache : Response_Cache | None = None, llm : BaseChatModel | None = None, parallel_tool_calls : bool = True, max_parallel_tools : int | None = None, tool_timeout : float | None = None, cache_scope : str | None = None) -> None:
         """An agent model with tools.
         
         Arguments:
@@ -28,6 +390,12 @@ class Agent():
             `max_iterations`: The maximum number of steps the agent can take.
             `debug`: Weather or not the agent should print a log to the console.
             `openai_api_key`: The openai API key, leave as `None` to use the enviorment variable `OPENAI_API_KEY`.
+            `response_cache`: The cache to reuse responses to repeated prompts and results of deterministic tools from, leave as `None` to always run the agent.
+            `llm`: The chat model to use, share one between agents to share its connections, leave as `None` to create one from `openai_model` and `temperature`.
+            `parallel_tool_calls`: Weather or not the tool calls the model requests in one turn should run concurrently, also when the agent is executed synchronously, then sync tools run in the threads set with `set_tool_threads`.
+            `max_parallel_tools`: The maximum amount of tool calls running at the same time, leave as `None` for no limit.
+            `tool_timeout`: The maximum amount of seconds a tool call can take before the model is told it timed out, leave as `None` for no limit.
+            `cache_scope`: Anything else the responses of the agent depend on, like the memory it recalls from, agents with the same settings only share cached responses if it matches, leave as `None` if the responses only depend on the settings.
                 
         Examples:
 
@@ -45,43 +413,212 @@ class Agent():
 
         openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
 
-        llm = ChatOpenAI(model=openai_model, temperature=temperature, api_key=openai_api_key)
-        llm_with_tools = llm.bind(functions = [format_tool_to_openai_function (t) for t in tools])
+        self.__model = openai_model
+        self.__response_cache = response_cache
+        self.__cache_scope = Response_Cache.scope(system_prompt, openai_model, temperature, cache_scope)
+        if(response_cache is not None):
+            tools = [response_cache.memoize_tool(t) if (t.metadata or {}).get("deterministic") else t for t in tools]
+        self.__parallel_tool_calls = parallel_tool_calls and len(tools) > 1
+        self.__max_parallel_tools = max_parallel_tools
+        self.__tool_timeout = tool_timeout
+        self.__tool_limits = weakref.WeakKeyDictionary()
+        if(max_parallel_tools is not None or tool_timeout is not None):
+            tools = [self.__limit_tool(t) if t.args_schema is not None else t for t in tools]
+
+        llm = llm or ChatOpenAI(model=openai_model, temperature=temperature, api_key=openai_api_key)
+        llm_with_tools = llm.bind(tools = _format_tools(tools)) if tools else llm
         prompt = ChatPromptTemplate.from_messages(
             [
                 (
                     "system",
                     system_prompt
                 ),
+                MessagesPlaceholder(variable_name = "history"),
                 ("user", "{input}"),
                 MessagesPlaceholder(variable_name = "agent_scratchpad"),
             ]
         )
-        agent = (
-            {
-                "input": lambda x: x["input"],
-                "agent_scratchpad": lambda x: format_to_openai_function_messages(
-                    x ["intermediate_steps"]
-                ),
-            }
-            | prompt
-            | llm_with_tools
-            | OpenAIFunctionsAgentOutputParser()
-        )
+        inputs = {
+            "input": lambda x: x["input"],
+            "history": lambda x: x.get("history", []),
+            "agent_scratchpad": lambda x: format_to_openai_tool_messages(
+                x ["intermediate_steps"]
+            ),
+        }
+        agent = inputs | prompt | llm_with_tools | OpenAIToolsAgentOutputParser()
+        streaming_agent = inputs | prompt | _streamed(llm_with_tools) | OpenAIToolsAgentOutputParser()
         self.__agent_executor = AgentExecutor(agent=agent, tools=tools, handle_parsing_errors=True, max_iterations=max_iterations, verbose=debug)
+        self.__streaming_executor = AgentExecutor(agent=streaming_agent, tools=tools, handle_parsing_errors=True, max_iterations=max_iterations, verbose=debug)
 
-    def execute(self, prompt : str) -> str:
+    def execute(self, prompt : str, session : Session | None = None) -> str:
         """Execute the agent with the given prompt as user input.
         
         Arguments:
 
             `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
+                
+        Returns: 
+        
+            The agent output after fully executing."""
+
+        if(self.__parallel_tool_calls and not _in_background_loop()):
+            return _run_sync(self.aexecute(prompt=prompt, session=session))
+
+        with span("agent.execute", model=self.__model) as agent_span:
+            if(self.__response_cache is not None and session is None):
+                output = self.__response_cache.get(self.__cache_scope, prompt)
+                if(output is not None):
+                    agent_span.set(cached=True)
+                    return output
+
+            with get_openai_callback() as usage:
+                output = self.__agent_executor.invoke({"input": prompt, "history": session.messages() if session else []}, config=_trace_config()).get("output")
+
+            if(session is not None):
+                session.add_turn(prompt, output, usage.prompt_tokens, usage.completion_tokens)
+            elif(self.__response_cache is not None):
+                self.__response_cache.set(self.__cache_scope, prompt, output)
+            return output
+
+    async def aexecute(self, prompt : str, session : Session | None = None) -> str:
+        """Execute the agent asynchronously with the given prompt as user input.
+        LLM requests and tool calls are awaited, so many agents can run concurrently on one event loop.
+        
+        Arguments:
+
+            `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
                 
         Returns: 
         
             The agent output after fully executing."""
 
-        return self.__agent_executor.invoke({"input": prompt }).get("output")
+        with span("agent.execute", model=self.__model) as agent_span:
+            if(self.__response_cache is not None and session is None):
+                output = await self.__response_cache.aget(self.__cache_scope, prompt)
+                if(output is not None):
+                    agent_span.set(cached=True)
+                    return output
+
+            with get_openai_callback() as usage:
+                output = (await self.__agent_executor.ainvoke({"input": prompt, "history": session.messages() if session else []}, config=_trace_config())).get("output")
+
+            if(session is not None):
+                await session.aadd_turn(prompt, output, usage.prompt_tokens, usage.completion_tokens)
+            elif(self.__response_cache is not None):
+                await self.__response_cache.aset(self.__cache_scope, prompt, output)
+            return output
+
+    def stream(self, prompt : str, session : Session | None = None) -> Iterator[dict[str, Any]]:
+        """Execute the agent with the given prompt as user input and get its progress while it runs.
+        The tool calls are given as soon as they start and finish and the tokens of the answer as soon as the model writes them.
+
+        Arguments:
+
+            `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
+
+        Returns:
+
+            An iterator of events, every event is a dictionary with a `type` of either `'tool_start'` with the `tool` and its `input`, `'tool_end'` with the `tool` and its `output`, `'token'` with the `content` of the token or `'end'` with the full `output` of the agent as the last event.
+
+        Examples:
+
+        .. code-block:: python
+            for event in agent.stream(\"What is 2 + 3?\"):
+                if(event[\"type\"] == \"token\"):
+                    print(event[\"content\"], end=\"\")"""
+
+        events = self.astream(prompt=prompt, session=session)
+        try:
+            while(True):
+                try:
+                    yield _run_sync(events.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            _run_sync(events.aclose())
+
+    async def astream(self, prompt : str, session : Session | None = None) -> AsyncIterator[dict[str, Any]]:
+        """Execute the agent asynchronously with the given prompt as user input and get its progress while it runs.
+        The tool calls are given as soon as they start and finish and the tokens of the answer as soon as the model writes them.
+
+        Arguments:
+
+            `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
+
+        Returns:
+
+            An async iterator of events, every event is a dictionary with a `type` of either `'tool_start'` with the `tool` and its `input`, `'tool_end'` with the `tool` and its `output`, `'token'` with the `content` of the token or `'end'` with the full `output` of the agent as the last event."""
+
+        if(self.__response_cache is not None and session is None):
+            output = await self.__response_cache.aget(self.__cache_scope, prompt)
+            if(output is not None):
+                yield {"type" : "token", "content" : output}
+                yield {"type" : "end", "output" : output}
+                return
+
+        queue = asyncio.Queue()
+        trace_config = _trace_config()
+        callbacks = [_Stream_Handler(queue)] + (trace_config["callbacks"] if trace_config else [])
+        run = asyncio.ensure_future(self.__streaming_executor.ainvoke({"input": prompt, "history": session.messages() if session else []}, config={"callbacks" : callbacks}))
+        run.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while((event := await queue.get()) is not None):
+                yield event
+            output = run.result().get("output")
+        finally:
+            run.cancel()
+
+        # Streamed responses do not report their token usage, so only the history of the session is updated.
+        if(session is not None):
+            await session.aadd_turn(prompt, output)
+        elif(self.__response_cache is not None):
+            await self.__response_cache.aset(self.__cache_scope, prompt, output)
+        yield {"type" : "end", "output" : output}
+
+    def clear_cache(self) -> None:
+        """Remove the cached responses of this agent from its response cache, call this when the information the agent relies on changes."""
+
+        if(self.__response_cache is not None):
+            self.__response_cache.invalidate(self.__cache_scope)
+
+    def __limit_tool(self, tool : BaseTool) -> BaseTool:
+        timeout_message = f"The tool {tool.name} did not finish within {self.__tool_timeout} seconds."
+
+        def run(**kwargs : Any) -> Any:
+            if(self.__tool_timeout is None):
+                return tool.run(kwargs)
+            try:
+                return _tool_threads.submit(tool.run, kwargs).result(timeout=self.__tool_timeout)
+            except FutureTimeoutError:
+                return timeout_message
+
+        async def arun(**kwargs : Any) -> Any:
+            limit = None
+            if(self.__max_parallel_tools is not None):
+                limit = self.__tool_limits.setdefault(asyncio.get_running_loop(), asyncio.Semaphore(self.__max_parallel_tools))
+                await limit.acquire()
+            try:
+                return await asyncio.wait_for(tool.arun(kwargs), timeout=self.__tool_timeout)
+            except asyncio.TimeoutError:
+                return timeout_message
+            finally:
+                if(limit is not None):
+                    limit.release()
+
+        return StructuredTool.from_function(func=run, coroutine=arun, name=tool.name, description=tool.description, args_schema=tool.args_schema, return_direct=tool.return_direct, metadata=tool.metadata)
+
+_images_per_request = {"dall-e-2" : 10}
+
+def _write_base64(data : str, writer : BinaryIO, chunk_size : int = 1 << 20) -> None:
+    """Decode base64 data in chunks, so besides the encoded data only one decoded chunk is held in memory."""
+
+    chunk_size -= chunk_size % 4
+    for start in range(0, len(data), chunk_size):
+        writer.write(base64.b64decode(data[start:start + chunk_size]))
 
 class Image_Generator():
     """An interface with the image generator from openai."""
@@ -103,10 +640,12 @@ class Image_Generator():
 
         openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
 
-        self.__client = OpenAI(api_key=openai_api_key)
+        self.__openai_api_key = openai_api_key
+        self.__client = None
+        self.__client_lock = threading.Lock()
         self.__model = openai_model
 
-    def create_image(self, prompt : str, size : Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"], quality : Literal["standard", "hd"], file : str) -> None:
+    def create_image(self, prompt : str, size : Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"], quality : Literal["standard", "hd"], file : str | BinaryIO | None = None) -> bytes | None:
         """Create an image file based on the given prompt.
         
         Arguments:
@@ -114,17 +653,84 @@ class Image_Generator():
             `prompt`: The prompt for the image generator.
             `size`: The size of the image, needs to be one of: `'56x256'`, `'512x512'`, `'1024x1024'`, `'1792x1024'`, `'1024x1792'`.
             `quality`: The quality of the image, needs to be one of: `'standard'`, `'hd'`.
-            `file`: The file path to save the image to."""
-
-        response = self.__client.images.generate(
-        model=self.__model,
-        prompt=prompt,
-        size=size,
-        quality=quality,
-        n=1,
-        response_format="b64_json",
-        )
+            `file`: The file path or the writable binary file object to save the image to, leave as `None` to get the image as bytes.
+
+        Returns:
+
+            The image as bytes if no `file` is given, otherwise `None`."""
+
+        return self.__save(self.__generate(prompt, size, quality, 1)[0], file)
+
+    def create_images(self, prompts : Sequence[str], size : Literal["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"], quality : Literal["standard", "hd"], files : Sequence[str | BinaryIO] | None = None, max_parallel : int = 4) -> list[dict[str, Any]]:
+        """Create many images at the same time.
+        Repeated prompts are generated with one request where the model allows it, and an image that fails does not stop the others.
+
+        Arguments:
+
+            `prompts`: The prompts for the image generator, one for every image.
+            `size`: The size of the images, needs to be one of: `'56x256'`, `'512x512'`, `'1024x1024'`, `'1792x1024'`, `'1024x1792'`.
+            `quality`: The quality of the images, needs to be one of: `'standard'`, `'hd'`.
+            `files`: The file paths or writable binary file objects to save the images to, one for every prompt, leave as `None` to get the images as bytes.
+            `max_parallel`: The maximum amount of requests running at the same time.
+
+        Returns:
+
+            A result for every prompt in the same order, with the `image` as bytes if no `files` are given and the `error` if it failed.
+
+        Examples:
+
+        .. code-block:: python
+            results = generator.create_images(prompts=[\"Draw a dragon.\"] * 4 + [\"Draw a castle.\"], size=\"512x512\", quality=\"standard\", files=[f\"./image_{i}.png\" for i in range(5)])"""
+
+        files = list(files) if files is not None else [None] * len(prompts)
+        images_per_request = _images_per_request.get(self.__model, 1)
+        same_prompts = {}
+        for i, prompt in enumerate(prompts):
+            same_prompts.setdefault(prompt, []).append(i)
+        requests = [(prompt, indices[start:start + images_per_request]) for prompt, indices in same_prompts.items() for start in range(0, len(indices), images_per_request)]
+        results = [None] * len(prompts)
+
+        def run(request : tuple[str, list[int]]) -> None:
+            prompt, indices = request
+            try:
+                images = self.__generate(prompt, size, quality, len(indices))
+            except Exception as error:
+                for i in indices:
+                    results[i] = {"image" : None, "error" : f"{type(error).__name__}: {error}"}
+                return
+            for i, image in zip(indices, images):
+                try:
+                    results[i] = {"image" : self.__save(image, files[i]), "error" : None}
+                except Exception as error:
+                    results[i] = {"image" : None, "error" : f"{type(error).__name__}: {error}"}
+
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            list(executor.map(run, requests))
+        return results
+
+    def __generate(self, prompt : str, size : str, quality : str, amount : int) -> list[str]:
+        with self.__client_lock:
+            if(self.__client is None):
+                self.__client = OpenAI(api_key=self.__openai_api_key)
+        with span("image.generate", model=self.__model, size=size, quality=quality, images=amount):
+            response = self.__client.images.generate(
+            model=self.__model,
+            prompt=prompt,
+            size=size,
+            quality=quality,
+            n=amount,
+            response_format="b64_json",
+            )
+        return [image.b64_json for image in response.data]
 
-        img_data = str.encode(response.data[0].b64_json)
-        with open(file, "wb") as writer:
-            writer.write(base64.decodebytes(img_data))
+    def __save(self, data : str, file : str | BinaryIO | None) -> bytes | None:
+        if(file is None):
+            buffer = io.BytesIO()
+            _write_base64(data, buffer)
+            return buffer.getvalue()
+        if(isinstance(file, str)):
+            with open(file, "wb") as writer:
+                _write_base64(data, writer)
+        else:
+            _write_base64(data, file)
+        return None
@@ -1,24 +1,66 @@
 """A module containing all QDrant API integrations."""
 
 import os
+import time
+import uuid
+import asyncio
+import hashlib
+import weakref
+import threading
+import contextlib
+from typing import Any, Callable, ContextManager, Iterable
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.vectorstores.qdrant import Qdrant
 from langchain.embeddings.openai import OpenAIEmbeddings
 from qdrant_client.http import models
-from qdrant_client import QdrantClient
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.local.qdrant_local import QdrantLocal
+from langchain_core.embeddings import Embeddings
+from .cache import Embedding_Cache, Cached_Embeddings
+from .search import _words, _hybrid_rerank, _merge
+from ..tracing import span
+
+_indexed_fields = {
+    "metadata.topic" : models.PayloadSchemaType.KEYWORD,
+    "metadata.subtopic" : models.PayloadSchemaType.KEYWORD,
+    "metadata.tenant" : models.PayloadSchemaType.KEYWORD,
+    "metadata.timestamp" : models.PayloadSchemaType.FLOAT,
+    "page_content" : models.TextIndexParams(type="text", tokenizer=models.TokenizerType.WORD, lowercase=True, min_token_len=2, max_token_len=32),
+}
+
+_local_locks = weakref.WeakKeyDictionary()
+_local_locks_lock = threading.Lock()
+
+def _async_client(client : QdrantClient, db_url : str | None, db_api_key : str | None) -> AsyncQdrantClient | None:
+    # The local modes of qdrant keep their data inside of the sync client, an async client would open a separate database.
+    if(isinstance(getattr(client, "_client", None), QdrantLocal)):
+        return None
+    return AsyncQdrantClient(location=db_url, api_key=db_api_key)
+
+def _client_lock(client : QdrantClient) -> ContextManager:
+    # The local modes of qdrant are not thread safe, all databases sharing a local client hold the same lock around its calls.
+    if(not isinstance(getattr(client, "_client", None), QdrantLocal)):
+        return contextlib.nullcontext()
+    with _local_locks_lock:
+        return _local_locks.setdefault(client, threading.RLock())
 
 class Vector_DB():
     """An interface with qdrant vector databases."""
 
-    def __init__(self, db_name : str, db_url : str | None = None, db_api_key : str | None = None, embeddings_api_key : str | None = None) -> None:
+    def __init__(self, db_name : str, db_url : str | None = None, db_api_key : str | None = None, embeddings_api_key : str | None = None, embedding_cache : Embedding_Cache | None = None, client : QdrantClient | None = None, embeddings : Embeddings | None = None, async_client : AsyncQdrantClient | None = None) -> None:
         """An interface with qdrant vector databases.
 
         Arguments:
 
             `db_name`: The name of the database.
-            `db_url`: The qdrant database url, leave as `None` to use the enviorment variable `QDRANT_DATABASE_URL`.
+            `db_url`: The qdrant database url or `':memory:'` for a local in-memory database, leave as `None` to use the enviorment variable `QDRANT_DATABASE_URL`.
             `db_api_key`: The qdrant API key, leave as `None` to use the enviorment variable `QDRANT_API_KEY`.
             `embeddings_api_key`: The openai API key, leave as `None` to use the enviorment variable `OPENAI_API_KEY`.
+            `embedding_cache`: The cache to look up embeddings in before calling the embeddings API, leave as `None` to embed every text.
+            `client`: The qdrant client to use, share one between databases to share its connections, leave as `None` to create one from `db_url` and `db_api_key`.
+            `embeddings`: The embeddings model to use, share one between databases to share its connections, leave as `None` to create an openai embeddings model.
+            `async_client`: The async qdrant client used by the asynchronous methods, share one between databases to share its connections, leave as `None` to create one from `db_url` and `db_api_key` if `client` is `None`, otherwise and for the local `':memory:'` and folder modes the asynchronous methods run the sync client in a thread, a local client only runs one call at a time as it is not thread safe.
                 
         Examples:
 
@@ -32,43 +74,407 @@ class Vector_DB():
         embeddings_api_key = embeddings_api_key or os.environ.get("OPENAI_API_KEY")
 
         self.__db_name = db_name
-        client = QdrantClient(url=db_url, api_key=db_api_key)
-        embeddings = OpenAIEmbeddings(api_key=embeddings_api_key)
-        self.__vector_store = Qdrant(client=client, collection_name=db_name, embeddings=embeddings)
+        self.__text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+        self.__write_hooks = []
+        if(client is None):
+            client = QdrantClient(location=db_url, api_key=db_api_key)
+            async_client = async_client or _async_client(client, db_url, db_api_key)
+        embeddings = embeddings or OpenAIEmbeddings(api_key=embeddings_api_key)
+        if(embedding_cache is not None):
+            embeddings = Cached_Embeddings(embeddings=embeddings, cache=embedding_cache)
+        self.__vector_store = Qdrant(client=client, collection_name=db_name, embeddings=embeddings, async_client=async_client)
+        self.__client_lock = _client_lock(client)
+
+    @property
+    def db_name(self) -> str:
+        """The name of the database."""
+
+        return self.__db_name
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """The embeddings model of the database, including its embedding cache."""
+
+        return self.__vector_store.embeddings
+
+    def add_write_hook(self, hook : Callable[[], None]) -> None:
+        """Add a function that is called every time entries are added to the database or it is reset, for example to invalidate a `Response_Cache`.
+
+        Arguments:
+
+            `hook`: The function to call."""
+
+        self.__write_hooks.append(hook)
 
-    def add_to_db(self, text: str) -> None:
+    def add_to_db(self, text: str, metadata : dict[str, Any] | None = None, duplicate_threshold : float | None = None) -> int:
         """Add an entry to the database.
 
         Arguments:
 
-            `text`: The text to add to the database."""
+            `text`: The text to add to the database.
+            `metadata`: The fields stored with the entry to filter by, the fields `topic`, `subtopic`, `tenant` and `timestamp` are indexed, the `timestamp` is set to the current time if it is not given.
+            `duplicate_threshold`: The score above which a chunk counts as a duplicate of an existing entry of the same tenant and is not added, leave as `None` to add every chunk.
+
+        Returns:
+
+            The amount of chunks added to the database.
+
+        Examples:
+
+        .. code-block:: python
+            vector_db.add_to_db(text=\"The favourite color of the user is blue.\", metadata={\"tenant\" : \"alice\"}, duplicate_threshold=0.95)"""
+
+        with span("vector_db.add", db=self.__db_name, backend="qdrant") as add_span:
+            docs, ids, metadatas = self.__split(text, metadata)
+            docs = self.__add_new(docs, ids, metadatas, self.embeddings.embed_documents(docs), duplicate_threshold)
+            add_span.set(chunks=len(docs), skipped=len(ids) - len(docs))
+        if(docs):
+            self.__written()
+        return len(docs)
+
+    async def aadd_to_db(self, text: str, metadata : dict[str, Any] | None = None, duplicate_threshold : float | None = None) -> int:
+        """Add an entry to the database asynchronously.
+
+        Arguments:
+
+            `text`: The text to add to the database.
+            `metadata`: The fields stored with the entry to filter by, the fields `topic`, `subtopic`, `tenant` and `timestamp` are indexed, the `timestamp` is set to the current time if it is not given.
+            `duplicate_threshold`: The score above which a chunk counts as a duplicate of an existing entry of the same tenant and is not added, leave as `None` to add every chunk.
+
+        Returns:
+
+            The amount of chunks added to the database."""
+
+        with span("vector_db.add", db=self.__db_name, backend="qdrant") as add_span:
+            docs, ids, metadatas = self.__split(text, metadata)
+            docs = await self.__aadd_new(docs, ids, metadatas, await self.embeddings.aembed_documents(docs), duplicate_threshold)
+            add_span.set(chunks=len(docs), skipped=len(ids) - len(docs))
+        if(docs):
+            self.__written()
+        return len(docs)
+
+    def add_many(self, texts : Iterable[str | tuple[str, dict[str, Any]]], batch_size : int = 64, max_in_flight : int = 4, skip_existing : bool = False, progress : Callable[[int, int], None] | None = None) -> int:
+        """Add many entries to the database in batches.
+        The texts are streamed through the text splitter and the chunks are embedded and upserted in batches, while at most `max_in_flight` batches are sent at the same time.
+        Every chunk gets a point ID derived from its text, so adding the same text again overwrites the existing points instead of duplicating them.
+
+        Arguments:
+
+            `texts`: The texts to add to the database, or tuples of a text and its metadata, can be any iterable including generators.
+            `batch_size`: The amount of chunks embedded and upserted per request.
+            `max_in_flight`: The maximum amount of batches sent at the same time.
+            `skip_existing`: Weather or not chunks that are already in the database should be skipped without embedding them, use this to resume an interrupted ingestion.
+            `progress`: A function called after every finished batch with the amount of texts read and the amount of chunks added so far.
+
+        Returns:
+
+            The amount of chunks added to the database."""
 
-        textSplitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-        docs = textSplitter.split_text(text)
-        self.__vector_store.add_texts(texts = docs)
+        with span("vector_db.add_many", db=self.__db_name, backend="qdrant") as add_span:
+            counts = {"texts" : 0, "chunks" : 0}
 
-    def get_from_db(self, query: str, max_amount : int, accuracy : float) -> list[str]:
+            def upsert(batch : list[tuple[str, str, dict[str, Any]]]) -> int:
+                if(skip_existing):
+                    with self.__client_lock:
+                        existing = {str(point.id) for point in self.__vector_store.client.retrieve(collection_name=self.__db_name, ids=[point_id for point_id, _, _ in batch], with_payload=False, with_vectors=False)}
+                    batch = [chunk for chunk in batch if chunk[0] not in existing]
+                if(batch):
+                    docs = [doc for _, doc, _ in batch]
+                    self.__add_new(docs, [point_id for point_id, _, _ in batch], [metadata for _, _, metadata in batch], self.embeddings.embed_documents(docs), None)
+                return len(batch)
+
+            def finish(done : set) -> None:
+                for future in done:
+                    counts["chunks"] += future.result()
+                    if(progress is not None):
+                        progress(counts["texts"], counts["chunks"])
+
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                pending = set()
+                batch = []
+                for text in texts:
+                    docs, ids, metadatas = self.__split(*text) if isinstance(text, tuple) else self.__split(text)
+                    batch.extend(zip(ids, docs, metadatas))
+                    counts["texts"] += 1
+                    while(len(batch) >= batch_size):
+                        if(len(pending) >= max_in_flight):
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            finish(done)
+                        pending.add(executor.submit(upsert, batch[:batch_size]))
+                        batch = batch[batch_size:]
+                if(batch):
+                    pending.add(executor.submit(upsert, batch))
+                finish(wait(pending).done)
+
+            self.__written()
+            add_span.set(texts=counts["texts"], chunks=counts["chunks"])
+            return counts["chunks"]
+
+    def get_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[str]:
         """Query the database.
+        The filters and the accuracy are applied by the database server, so only matching entries are sent back.
+
+        Arguments:
+
+            `query`: The text query for the database.
+            `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
+            `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
+
+        Returns: 
+        
+            A list of matching entries in the database.
+
+        Examples:
+
+        .. code-block:: python
+            vector_db.get_from_db(query=\"favourite color\", max_amount=5, accuracy=0.75, filters={\"tenant\" : \"alice\", \"timestamp\" : (time.time() - 86400, None)})"""
+
+        return [text for text, _ in self.get_scored_from_db(query, max_amount, accuracy, filters, hybrid)]
+
+    def get_scored_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[tuple[str, float]]:
+        """Query the database and get the score of every entry.
 
         Arguments:
 
             `query`: The text query for the database.
             `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
             `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
+
+        Returns: 
+        
+            A list of matching entries in the database with their score, the best match first."""
+
+        with span("vector_db.search", db=self.__db_name, backend="qdrant", hybrid=hybrid, filtered=bool(filters)) as search_span:
+            with span("vector_db.embed", db=self.__db_name):
+                embedding = self.embeddings.embed_query(query)
+            results = self.__search(query, embedding, max_amount, accuracy, filters, hybrid)
+            search_span.set(results=len(results))
+            return results
+
+    async def aget_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[str]:
+        """Query the database asynchronously.
+
+        Arguments:
+
+            `query`: The text query for the database.
+            `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
+            `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
 
         Returns: 
         
             A list of matching entries in the database."""
 
-        result = self.__vector_store.similarity_search_with_score(query=query, k=max_amount)
-        results = []
-        for doc in result:
-            if(doc[1] >= accuracy):
-                results.append(doc[0].page_content)
-        return results
+        return [text for text, _ in await self.aget_scored_from_db(query, max_amount, accuracy, filters, hybrid)]
+
+    async def aget_scored_from_db(self, query: str, max_amount : int, accuracy : float, filters : dict[str, Any] | None = None, hybrid : bool = False) -> list[tuple[str, float]]:
+        """Query the database asynchronously and get the score of every entry.
+
+        Arguments:
+
+            `query`: The text query for the database.
+            `max_amount`: The maximum amount of entries returned, if they meet the accuracy.
+            `accuracy`: The minimum amount an entry needs to match the query, needs to be between `0` and `1` inclusive.
+            `filters`: The metadata fields the entries need to match, a list matches any of its values and a tuple `(minimum, maximum)` is an inclusive range where `None` is open, leave as `None` to search all entries.
+            `hybrid`: Weather or not to also find entries containing the words of the query and rank the entries by their vector score mixed with the share of query words they contain.
+
+        Returns: 
+        
+            A list of matching entries in the database with their score, the best match first."""
+
+        with span("vector_db.search", db=self.__db_name, backend="qdrant", hybrid=hybrid, filtered=bool(filters)) as search_span:
+            with span("vector_db.embed", db=self.__db_name):
+                embedding = await self.embeddings.aembed_query(query)
+            if(self.__vector_store.async_client is None):
+                results = await asyncio.to_thread(self.__search, query, embedding, max_amount, accuracy, filters, hybrid)
+            elif(not hybrid):
+                results = self.__results(await self.__vector_store.asimilarity_search_with_score_by_vector(embedding=embedding, k=max_amount, filter=self.__filter(filters), score_threshold=accuracy))
+            else:
+                results = self.__hybrid(query, await asyncio.gather(*[self.__vector_store.asimilarity_search_with_score_by_vector(embedding=embedding, k=3 * max_amount, filter=search_filter) for search_filter in self.__hybrid_filters(query, filters)]), max_amount, accuracy)
+            search_span.set(results=len(results))
+            return results
 
     def reset_db(self) -> None:
         """Reset the database."""
 
-        self.__vector_store.client.delete_collection(self.__db_name)
-        self.__vector_store.client.create_collection(collection_name=self.__db_name, vectors_config=models.VectorParams(size=1536, distance=models.Distance.COSINE))
+        with self.__client_lock:
+            self.__vector_store.client.delete_collection(self.__db_name)
+            self.__vector_store.client.create_collection(collection_name=self.__db_name, vectors_config=models.VectorParams(size=1536, distance=models.Distance.COSINE))
+            self.__create_indexes()
+        self.__written()
+
+    def create_db(self) -> None:
+        """Create the database if it does not exist yet, and the indexes of the metadata fields if they are missing."""
+
+        with self.__client_lock:
+            try:
+                collection = self.__vector_store.client.get_collection(self.__db_name)
+            except Exception:
+                self.__vector_store.client.create_collection(collection_name=self.__db_name, vectors_config=models.VectorParams(size=1536, distance=models.Distance.COSINE))
+                self.__create_indexes()
+            else:
+                self.__create_indexes(existing=set(collection.payload_schema or {}))
+
+    async def areset_db(self) -> None:
+        """Reset the database asynchronously."""
+
+        await asyncio.to_thread(self.reset_db)
+
+    def compact(self, similarity : float = 0.95, max_age : float | None = None, filters : dict[str, Any] | None = None, batch_size : int = 256) -> dict[str, int | float]:
+        """Remove near duplicate and stale entries from the database.
+        Every cluster of entries of the same tenant scoring at least `similarity` with each other is merged into its newest entry, the older ones are deleted.
+        The vectors never leave the database server except for the batch being compared, so this also works on large collections.
+
+        Arguments:
+
+            `similarity`: The minimum score two entries need to count as duplicates, needs to be between `0` and `1` inclusive.
+            `max_age`: The amount of seconds after which an entry is stale and deleted, leave as `None` to keep old entries.
+            `filters`: The metadata fields the compacted entries need to match, in the same format as for `get_from_db`, leave as `None` to compact all entries.
+            `batch_size`: The amount of entries compared per request.
+
+        Returns:
+
+            A report with the amount of entries `before` and `after`, the amount of `duplicates` and `stale` entries removed and the mean seconds a recall took `latency_before` and `latency_after`.
+
+        Examples:
+
+        .. code-block:: python
+            report = vector_db.compact(similarity=0.95, max_age=90 * 86400)
+            print(f\"{report['before']} -> {report['after']} entries\")"""
+
+        client = self.__vector_store.client
+        with span("vector_db.compact", db=self.__db_name, backend="qdrant") as compact_span, self.__client_lock:
+            search_filter = self.__filter(filters)
+            entries = []
+            offset = None
+            while(True):
+                records, offset = client.scroll(collection_name=self.__db_name, scroll_filter=search_filter, limit=batch_size, offset=offset, with_payload=["metadata"], with_vectors=False)
+                entries.extend((record.id, (record.payload or {}).get("metadata") or {}) for record in records)
+                if(offset is None):
+                    break
+            oldest = time.time() - max_age if max_age is not None else None
+            stale = [point_id for point_id, metadata in entries if oldest is not None and metadata.get("timestamp", oldest) < oldest]
+            fresh = sorted((entry for entry in entries if oldest is None or entry[1].get("timestamp", oldest) >= oldest), key=lambda entry: entry[1].get("timestamp", 0.0), reverse=True)
+            samples = [record.vector for record in client.retrieve(collection_name=self.__db_name, ids=[point_id for point_id, _ in fresh[::max(1, len(fresh) // 20)][:20]], with_vectors=True, with_payload=False)]
+            latency_before = self.__recall_latency(samples, search_filter)
+            for start in range(0, len(stale), batch_size):
+                client.delete(collection_name=self.__db_name, points_selector=models.PointIdsList(points=stale[start:start + batch_size]))
+            # The newest entries are visited first, so every entry that matches an entry kept before it is an older duplicate.
+            kept = set()
+            duplicates = 0
+            for start in range(0, len(fresh), batch_size):
+                batch = fresh[start:start + batch_size]
+                vectors = {str(record.id) : record.vector for record in client.retrieve(collection_name=self.__db_name, ids=[point_id for point_id, _ in batch], with_vectors=True, with_payload=False)}
+                requests = [models.SearchRequest(vector=vectors[str(point_id)], filter=self.__tenant_filter(filters, metadata), limit=16, score_threshold=similarity) for point_id, metadata in batch]
+                removed = []
+                for (point_id, _), hits in zip(batch, client.search_batch(collection_name=self.__db_name, requests=requests)):
+                    if(any(str(hit.id) in kept for hit in hits if str(hit.id) != str(point_id))):
+                        removed.append(point_id)
+                    else:
+                        kept.add(str(point_id))
+                if(removed):
+                    client.delete(collection_name=self.__db_name, points_selector=models.PointIdsList(points=removed))
+                    duplicates += len(removed)
+            if(stale or duplicates):
+                self.__written()
+            report = {"before" : len(entries), "after" : len(entries) - len(stale) - duplicates, "duplicates" : duplicates, "stale" : len(stale), "latency_before" : latency_before, "latency_after" : self.__recall_latency(samples, search_filter)}
+            compact_span.set(**report)
+            return report
+
+    def __split(self, text : str, metadata : dict[str, Any] | None = None) -> tuple[list[str], list[str], list[dict[str, Any]]]:
+        docs = self.__text_splitter.split_text(text)
+        metadata = dict(metadata or {})
+        metadata.setdefault("timestamp", time.time())
+        # The tenant is part of the ID, so the same text of different tenants in one collection is stored for each of them.
+        text_hash = hashlib.sha256(text.encode()).hexdigest()
+        prefix = f"{self.__db_name}/{metadata['tenant']}" if metadata.get("tenant") is not None else self.__db_name
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_URL, f"{prefix}/{text_hash}/{i}")) for i in range(len(docs))]
+        return docs, ids, [dict(metadata) for _ in docs]
+
+    def __add_new(self, docs : list[str], ids : list[str], metadatas : list[dict[str, Any]], vectors : list[list[float]], duplicate_threshold : float | None) -> list[str]:
+        client = self.__vector_store.client
+        with self.__client_lock:
+            new = list(range(len(docs))) if duplicate_threshold is None else [i for i, hits in enumerate(client.search_batch(collection_name=self.__db_name, requests=self.__duplicate_requests(vectors, metadatas, duplicate_threshold))) if not hits]
+            if(new):
+                client.upsert(collection_name=self.__db_name, points=self.__points(docs, ids, metadatas, vectors, new))
+        return [docs[i] for i in new]
+
+    async def __aadd_new(self, docs : list[str], ids : list[str], metadatas : list[dict[str, Any]], vectors : list[list[float]], duplicate_threshold : float | None) -> list[str]:
+        client = self.__vector_store.async_client
+        if(client is None):
+            return await asyncio.to_thread(self.__add_new, docs, ids, metadatas, vectors, duplicate_threshold)
+        new = list(range(len(docs))) if duplicate_threshold is None else [i for i, hits in enumerate(await client.search_batch(collection_name=self.__db_name, requests=self.__duplicate_requests(vectors, metadatas, duplicate_threshold))) if not hits]
+        if(new):
+            await client.upsert(collection_name=self.__db_name, points=self.__points(docs, ids, metadatas, vectors, new))
+        return [docs[i] for i in new]
+
+    def __points(self, docs : list[str], ids : list[str], metadatas : list[dict[str, Any]], vectors : list[list[float]], rows : list[int]) -> list[models.PointStruct]:
+        return [models.PointStruct(id=ids[i], vector=vectors[i], payload={"page_content" : docs[i], "metadata" : metadatas[i]}) for i in rows]
+
+    def __search(self, query : str, embedding : list[float], max_amount : int, accuracy : float, filters : dict[str, Any] | None, hybrid : bool) -> list[tuple[str, float]]:
+        with self.__client_lock:
+            if(not hybrid):
+                return self.__results(self.__vector_store.similarity_search_with_score_by_vector(embedding=embedding, k=max_amount, filter=self.__filter(filters), score_threshold=accuracy))
+            return self.__hybrid(query, [self.__vector_store.similarity_search_with_score_by_vector(embedding=embedding, k=3 * max_amount, filter=search_filter) for search_filter in self.__hybrid_filters(query, filters)], max_amount, accuracy)
+
+    def __duplicate_requests(self, vectors : list[list[float]], metadatas : list[dict[str, Any]], duplicate_threshold : float) -> list[models.SearchRequest]:
+        return [models.SearchRequest(vector=vector, filter=self.__tenant_filter(None, metadata), limit=1, score_threshold=duplicate_threshold) for vector, metadata in zip(vectors, metadatas)]
+
+    def __tenant_filter(self, filters : dict[str, Any] | None, metadata : dict[str, Any]) -> models.Filter | None:
+        if(metadata.get("tenant") is None):
+            return self.__filter(filters)
+        return self.__filter({**(filters or {}), "tenant" : metadata["tenant"]})
+
+    def __recall_latency(self, vectors : list[list[float]], search_filter : models.Filter | None) -> float:
+        if(not vectors):
+            return 0.0
+        started = time.perf_counter()
+        for vector in vectors:
+            self.__vector_store.client.search(collection_name=self.__db_name, query_vector=vector, query_filter=search_filter, limit=10)
+        return (time.perf_counter() - started) / len(vectors)
+
+    def __create_indexes(self, existing : set[str] | None = None) -> None:
+        client = self.__vector_store.client
+        # Payload indexes only exist on a qdrant server, the local client would just warn about them.
+        if(isinstance(getattr(client, "_client", None), QdrantLocal)):
+            return
+        for field, schema in _indexed_fields.items():
+            if(field not in (existing or set())):
+                client.create_payload_index(collection_name=self.__db_name, field_name=field, field_schema=schema)
+
+    def __filter(self, filters : dict[str, Any] | None) -> models.Filter | None:
+        if(not filters):
+            return None
+        conditions = []
+        for key, value in filters.items():
+            if(isinstance(value, tuple)):
+                conditions.append(models.FieldCondition(key=f"metadata.{key}", range=models.Range(gte=value[0], lte=value[1])))
+            elif(isinstance(value, list)):
+                conditions.append(models.FieldCondition(key=f"metadata.{key}", match=models.MatchAny(any=value)))
+            else:
+                conditions.append(models.FieldCondition(key=f"metadata.{key}", match=models.MatchValue(value=value)))
+        return models.Filter(must=conditions)
+
+    def __hybrid_filters(self, query : str, filters : dict[str, Any] | None) -> list[models.Filter | None]:
+        vector_filter = self.__filter(filters)
+        words = _words(query)
+        if(not words):
+            return [vector_filter]
+        keyword_filter = models.Filter(must=vector_filter.must if vector_filter else None, should=[models.FieldCondition(key="page_content", match=models.MatchText(text=word)) for word in words])
+        return [vector_filter, keyword_filter]
+
+    def __results(self, result : list[tuple[Any, float]]) -> list[tuple[str, float]]:
+        return [(doc.page_content, score) for doc, score in result]
+
+    def __hybrid(self, query : str, results : list[list[tuple[Any, float]]], max_amount : int, accuracy : float) -> list[tuple[str, float]]:
+        merged = _merge(*[self.__results(result) for result in results])
+        return [(text, score) for text, score in _hybrid_rerank(query, merged, max_amount) if score >= accuracy]
+
+    def __written(self) -> None:
+        for hook in self.__write_hooks:
+            hook()
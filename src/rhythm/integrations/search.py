@@ -0,0 +1,46 @@
+"""A module containing the search helpers shared by the vector databases."""
+
+import re
+from typing import Any
+
+def _words(text : str) -> set[str]:
+    """Get the lowercase words of a text."""
+
+    return set(re.findall(r"\w+", text.lower()))
+
+def _hybrid_rerank(query : str, results : list[tuple[str, float]], amount : int, keyword_weight : float = 0.3) -> list[tuple[str, float]]:
+    """Reorder vector search results by mixing the vector score with the share of query words found in each entry."""
+
+    query_words = _words(query)
+    if(not query_words):
+        return sorted(results, key=lambda result: result[1], reverse=True)[:amount]
+    reranked = []
+    for text, score in results:
+        overlap = len(query_words & _words(text)) / len(query_words)
+        reranked.append((text, (1 - keyword_weight) * score + keyword_weight * overlap))
+    reranked.sort(key=lambda result: result[1], reverse=True)
+    return reranked[:amount]
+
+def _merge(*results : list[tuple[str, float]]) -> list[tuple[str, float]]:
+    """Merge the results of several searches, keeping every entry once with its best score."""
+
+    merged = {}
+    for result in results:
+        for text, score in result:
+            merged[text] = max(score, merged.get(text, score))
+    return list(merged.items())
+
+def _matches(metadata : dict[str, Any], filters : dict[str, Any]) -> bool:
+    """Check if the metadata of an entry matches the filters, a list matches any of its values and a tuple is an inclusive range where `None` is open."""
+
+    for key, value in filters.items():
+        field = metadata.get(key)
+        if(isinstance(value, tuple)):
+            if(field is None or (value[0] is not None and field < value[0]) or (value[1] is not None and field > value[1])):
+                return False
+        elif(isinstance(value, list)):
+            if(field not in value):
+                return False
+        elif(field != value):
+            return False
+    return True
@@ -1,13 +1,58 @@
 """A module containing all Twitter / X API integrations."""
 
 import os
+import time
 import tweepy
+import hashlib
+import threading
+from typing import Any, Generator, Iterable, Iterator
+from collections import OrderedDict
 from typing_extensions import Literal
+from concurrent.futures import Future, ThreadPoolExecutor
+from ..tracing import span, count
+
+class _Token_Bucket():
+    """A token bucket that allows `capacity` calls at once and refills at `capacity` calls per `window` seconds."""
+
+    def __init__(self, capacity : int, window : float) -> None:
+        self.__capacity = capacity
+        self.__rate = capacity / window
+        self.__tokens = float(capacity)
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take a token, waiting until one is available."""
+
+        while(True):
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+                self.__updated = now
+                if(self.__tokens >= 1):
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.__rate
+            time.sleep(wait)
+
+    def pause(self, seconds : float) -> None:
+        """Take all tokens and start refilling only after `seconds`, used when the API reports that the limit is reached."""
+
+        with self.__lock:
+            self.__tokens = 0.0
+            self.__updated = time.monotonic() + seconds
+
+def _file_hash(path : str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 class Twitter():
     """An interface with the twitter API."""
      
-    def __init__(self, consumer_key : str | None = None, consumer_secret : str | None = None, access_token : str | None = None, access_token_secret : str | None = None, bearer_token : str | None = None) -> None:
+    def __init__(self, consumer_key : str | None = None, consumer_secret : str | None = None, access_token : str | None = None, access_token_secret : str | None = None, bearer_token : str | None = None, tweets_per_window : int = 200, rate_limit_window : float = 900.0, max_parallel_uploads : int = 4, search_cache_ttl : float = 30.0) -> None:
         """An interface with the twitter API.
 
         Arguments:
@@ -17,6 +62,10 @@ class Twitter():
             `access_token`: The access token of the account, leave as `None` to use the enviorment variable `TWITTER_ACCESS_TOKEN`.
             `access_token_secret`: The access token secret of the account, leave as `None` to use the enviorment variable `TWITTER_ACCESS_TOKEN_SECRET`.
             `bearer_token`: The bearer token of the account, leave as `None` to use the enviorment variable `TWITTER_BEARER_TOKEN`.
+            `tweets_per_window`: The amount of tweets the account can post per rate limit window, posts beyond it wait for the window instead of failing.
+            `rate_limit_window`: The length of the rate limit window in seconds.
+            `max_parallel_uploads`: The maximum amount of images uploaded at the same time.
+            `search_cache_ttl`: The amount of seconds the results of a search are reused for identical searches, set to `0` to always call the API.
             
         Examples:
 
@@ -35,38 +84,72 @@ class Twitter():
         auth.set_access_token(access_token, access_token_secret)
         self.__api = tweepy.API(auth)
         self.__client = tweepy.Client(bearer_token=bearer_token, consumer_key=consumer_key, consumer_secret= consumer_secret, access_token=access_token, access_token_secret=access_token_secret)
-        
+        self.__tweet_limit = _Token_Bucket(tweets_per_window, rate_limit_window)
+        self.__uploads = ThreadPoolExecutor(max_workers=max_parallel_uploads, thread_name_prefix="rhythm-twitter")
+        self.__media = {}
+        self.__media_lock = threading.Lock()
+        self.__search_cache_ttl = search_cache_ttl
+        self.__searches = OrderedDict()
+        self.__polls = {}
+        self.__search_lock = threading.Lock()
 
-    def tweet(self, textcontent : str | None = None, images_paths : list[str] | None = None) -> None:
+    def tweet(self, textcontent : str | None = None, images_paths : list[str] | None = None) -> int:
         """Post a new tweet with text or images.
 
         Arguments:
 
             `textcontent`: The textcontent of the tweet, if left as `None`, `images_path` needs to be given.
-            `images_paths`: The list of file paths of the images to post, needs to be at most length `4`, if left as `None`, `textcontent` needs to be given."""
+            `images_paths`: The list of file paths of the images to post, needs to be at most length `4`, if left as `None`, `textcontent` needs to be given.
 
-        media_ids = []
-        for image in images_paths[:4]:
-            media  = self.__api.simple_upload(filename=image)
-            media_ids.append(media.media_id)
-        
-        self.__client.create_tweet(text=textcontent, media_ids=media_ids)
+        Returns:
+
+            The ID of the new tweet."""
+
+        return self.__create_tweet(text=textcontent, media_ids=self.__upload(images_paths or []) or None)
     
-    def reply_to_tweet(self, tweet_id : int, textcontent : str | None = None, images_paths : list[str] | None = None) -> None:
+    def reply_to_tweet(self, tweet_id : int, textcontent : str | None = None, images_paths : list[str] | None = None) -> int:
         """Reply to a tweet with text or images.
 
         Arguments:
 
             `tweet_id`: The ID of the tweet to reply to.
             `textcontent`: The textcontent of the tweet, if left as `None`, `images_path` needs to be given.
-            `images_paths`: The list of file paths of the images to post, needs to be at most length `4`, if left as `None`, `textcontent` needs to be given."""
+            `images_paths`: The list of file paths of the images to post, needs to be at most length `4`, if left as `None`, `textcontent` needs to be given.
+
+        Returns:
+
+            The ID of the reply."""
+
+        return self.__create_tweet(in_reply_to_tweet_id=tweet_id, text=textcontent, media_ids=self.__upload(images_paths or []) or None)
+
+    def tweet_many(self, tweets : Iterable[dict[str, Any]], max_parallel : int = 4) -> list[dict[str, Any]]:
+        """Post many tweets and replies, while staying within the rate limit of the account.
+        Posts beyond the rate limit wait until the window allows them instead of failing, and a post that fails does not stop the others.
+
+        Arguments:
+
+            `tweets`: The tweets to post, every tweet is a dictionary with the arguments of `tweet`, or of `reply_to_tweet` if it contains a `tweet_id`.
+            `max_parallel`: The maximum amount of tweets posted at the same time, with more than `1` they can be posted in a different order.
+
+        Returns:
+
+            A result for every tweet in the same order, with the `id` of the new tweet and the `error` if it failed.
+
+        Examples:
+
+        .. code-block:: python
+            results = twitter.tweet_many([{\"textcontent\" : \"This is a Test Tweet!\", \"images_paths\" : [\"./image.png\"]}, {\"tweet_id\" : 123456789, \"textcontent\" : \"This is a Test Reply!\"}])"""
 
-        media_ids = []
-        for image in images_paths[:4]:
-            media  = self.__api.simple_upload(filename=image)
-            media_ids.append(media.media_id)
+        def post(tweet : dict[str, Any]) -> dict[str, Any]:
+            try:
+                if(tweet.get("tweet_id") is not None):
+                    return {"id" : self.reply_to_tweet(**tweet), "error" : None}
+                return {"id" : self.tweet(**tweet), "error" : None}
+            except Exception as error:
+                return {"id" : None, "error" : f"{type(error).__name__}: {error}"}
 
-        self.__client.create_tweet(in_reply_to_tweet_id=tweet_id, text=textcontent, media_ids=media_ids)
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            return list(executor.map(post, tweets))
 
     def send_direct_message(self, user_id : int, textcontent : str | None = None, image_path : str | None = None) -> None:
         """Send a direct message with text or image.
@@ -79,31 +162,146 @@ class Twitter():
 
         media_id = None
         if(image_path):
-            media  = self.__api.simple_upload(filename=image_path)
-            media_id = media.media_id
+            media_id = self.__upload([image_path])[0]
 
         self.__api.send_direct_message(recipient_id=user_id, text=textcontent, attachment_type="media", attachment_media_id=media_id)
 
-    def get_tweets(self, query : str, language_code : str | None = None, count : int = 15, result_type : Literal["mixed", "recent", "popular"] = "mixed") -> list[str]:
+    def get_tweets(self, query : str, language_code : str | None = None, count : int = 15, result_type : Literal["mixed", "recent", "popular"] = "mixed") -> list[dict[str, Any]]:
         """Get tweets based on a search query.
         
         Agruments:
         
             `query`: The search query, needs to be at most `500` characters.
             `language_code`: The [ISO 639-1](https://en.wikipedia.org/wiki/List_of_ISO_639_language_codes) language code to filter by language, leave as `None` to get all languages.
-            `count`: The maximum amount of tweets to return, needs to be at most `100`.
+            `count`: The maximum amount of tweets to return, use `iter_tweets` for more than `100`.
             `result_type`: The prefered resulting tweets, needs to be one of: `'mixed'`, `'recent'`, `'popular'`.
             
         Returns:
 
-            A list of the filtered tweets. Contains the username and textcontent."""
+            A list of the filtered tweets. Contains the username, textcontent and ID."""
         
-        if(language_code != None):
-            tweets = self.__api.search_tweets(q=query, lang=language_code, tweet_mode="extended", count=count, result_type=result_type)
-        else:
-            tweets = self.__api.search_tweets(q=query, tweet_mode="extended", count=count, result_type=result_type)
-
-        tweet_list = []
-        for tweet in tweets.statuses:
-            tweet_list.append({"username" : tweet.user.name, "tweet_text" : tweet.text})
-        return tweet_list
+        return list(self.iter_tweets(query=query, limit=count, language_code=language_code, result_type=result_type))
+
+    def iter_tweets(self, query : str, limit : int | None = None, language_code : str | None = None, result_type : Literal["mixed", "recent", "popular"] = "mixed", since_id : int | None = None, since_last : bool = False) -> Iterator[dict[str, Any]]:
+        """Iterate over the tweets of a search query, the next page is only requested when the tweets of the previous one are used up.
+        Identical pages requested within `search_cache_ttl` seconds are taken from the cache instead of the API.
+
+        Arguments:
+
+            `query`: The search query, needs to be at most `500` characters.
+            `limit`: The maximum amount of tweets to return, leave as `None` for all tweets the API gives.
+            `language_code`: The [ISO 639-1](https://en.wikipedia.org/wiki/List_of_ISO_639_language_codes) language code to filter by language, leave as `None` to get all languages.
+            `result_type`: The prefered resulting tweets, needs to be one of: `'mixed'`, `'recent'`, `'popular'`.
+            `since_id`: Only return tweets newer than the tweet with this ID, leave as `None` for all tweets.
+            `since_last`: Weather or not to only return tweets the last searches with the same query, language and result type did not return, use this to poll a query, the first poll starts at the newest tweets and when a poll is stopped by the `limit` the next ones first return the older tweets it did not reach, so no tweet is skipped.
+
+        Returns:
+
+            An iterator of the filtered tweets. Contains the username, textcontent and ID.
+
+        Examples:
+
+        .. code-block:: python
+            for tweet in twitter.iter_tweets(query=\"#AI\", limit=500, since_last=True):
+                print(tweet[\"username\"], tweet[\"tweet_text\"])"""
+
+        search = (query, language_code, result_type)
+        if(not since_last):
+            yield from self.__iter_pages(search, limit, since_id, None)
+            return
+
+        with self.__search_lock:
+            watermark, backfill = self.__polls.get(search, (None, None))
+        amount = 0
+        if(backfill is not None):
+            # The tweets between the watermark of a poll stopped by the limit and the oldest tweet it returned come before newer ones.
+            floor, top = backfill
+            amount, _, cursor = yield from self.__iter_pages(search, limit, max(floor, since_id or 0) or None, top)
+            if(cursor is not None):
+                with self.__search_lock:
+                    self.__polls[search] = (watermark, (floor, cursor))
+                return
+
+        _, newest, cursor = yield from self.__iter_pages(search, limit - amount if limit is not None else None, max(watermark or 0, since_id or 0) or None, None)
+        # The first poll starts at the newest tweets, a later one stopped by the limit leaves the tweets between the watermark and the oldest tweet it returned to backfill.
+        backfill = (watermark, cursor) if watermark is not None and cursor is not None and newest else None
+        with self.__search_lock:
+            self.__polls[search] = (max(watermark or 0, newest) or None, backfill)
+
+    def __iter_pages(self, search : tuple[str, str | None, str], limit : int | None, since_id : int | None, max_id : int | None) -> Generator[dict[str, Any], None, tuple[int, int, int | None]]:
+        # Gives back the amount of returned tweets, the newest returned tweet ID and the max_id to continue from, or None once every page was returned.
+        query, language_code, result_type = search
+        amount = 0
+        newest = 0
+        while(limit is None or amount < limit):
+            page = self.__search(q=query, lang=language_code, result_type=result_type, count=min(100, limit - amount) if limit is not None else 100, since_id=since_id, max_id=max_id)
+            if(not page):
+                return amount, newest, None
+            page = page[:limit - amount if limit is not None else None]
+            for tweet in page:
+                yield tweet
+            amount += len(page)
+            newest = max(newest, max(tweet["tweet_id"] for tweet in page))
+            max_id = min(tweet["tweet_id"] for tweet in page) - 1
+        return amount, newest, max_id
+
+    def __create_tweet(self, **kwargs : Any) -> int:
+        with span("twitter.tweet", reply="in_reply_to_tweet_id" in kwargs, images=len(kwargs.get("media_ids") or [])):
+            while(True):
+                self.__tweet_limit.acquire()
+                try:
+                    # The v2 API gives the ID as a string, it is returned as an int like the IDs of searched tweets.
+                    return int(self.__client.create_tweet(**kwargs).data["id"])
+                except tweepy.TooManyRequests as error:
+                    count("rate_limited", component="twitter")
+                    reset = float(error.response.headers.get("x-rate-limit-reset", 0)) - time.time()
+                    self.__tweet_limit.pause(max(reset, 1.0))
+
+    def __search(self, **kwargs : Any) -> list[dict[str, Any]]:
+        key = tuple(sorted(kwargs.items()))
+        now = time.monotonic()
+        with self.__search_lock:
+            cached = self.__searches.get(key)
+            if(cached is not None and cached[1] > now):
+                count("cache_lookups", cache="twitter_search", result="hit")
+                return cached[0]
+        count("cache_lookups", cache="twitter_search", result="miss")
+
+        with span("twitter.search", result_type=kwargs.get("result_type")) as search_span:
+            statuses = self.__api.search_tweets(tweet_mode="extended", **{name : value for name, value in kwargs.items() if value is not None})
+            search_span.set(tweets=len(statuses))
+        page = [{"username" : tweet.user.name, "tweet_text" : getattr(tweet, "full_text", None) or tweet.text, "tweet_id" : tweet.id} for tweet in statuses]
+
+        if(self.__search_cache_ttl > 0):
+            with self.__search_lock:
+                self.__searches.pop(key, None)
+                self.__searches[key] = (page, now + self.__search_cache_ttl)
+                while(self.__searches and (len(self.__searches) > 256 or next(iter(self.__searches.values()))[1] <= now)):
+                    self.__searches.popitem(last=False)
+        return page
+
+    def __upload(self, images_paths : list[str]) -> list[int]:
+        uploads = [self.__media_upload(path) for path in images_paths[:4]]
+        return [upload.result()[0] for upload in uploads]
+
+    def __media_upload(self, path : str) -> Future:
+        # Uploads of the same content share their media ID until it expires, also while the first upload is still running.
+        file_hash = _file_hash(path)
+        now = time.monotonic()
+        with self.__media_lock:
+            upload = self.__media.get(file_hash)
+            if(upload is not None and (not upload.done() or (upload.exception() is None and upload.result()[1] > now))):
+                count("cache_lookups", cache="twitter_media", result="hit")
+                return upload
+            for key in [key for key, cached in self.__media.items() if cached.done() and (cached.exception() is not None or cached.result()[1] <= now)]:
+                del self.__media[key]
+            count("cache_lookups", cache="twitter_media", result="miss")
+            upload = self.__uploads.submit(self.__upload_file, path)
+            self.__media[file_hash] = upload
+            return upload
+
+    def __upload_file(self, path : str) -> tuple[int, float]:
+        with span("twitter.upload", size=os.path.getsize(path)):
+            media = self.__api.simple_upload(filename=path)
+        # Media IDs expire after a day unless the API says otherwise, they are reused only until a minute before that.
+        return media.media_id, time.monotonic() + getattr(media, "expires_after_secs", 86400) - 60
@@ -1,25 +1,140 @@
 """A module containing all Robot agents."""
 
 import os
-from ctypes import cast, py_object
-from .integrations.openai import Agent, tool, Sequence, BaseTool
-from .integrations.qdrant_db import Vector_DB
+import time
+import asyncio
+import threading
+import weakref
+from typing import Any, AsyncIterator, Iterable, Iterator
+from collections import OrderedDict
+from typing_extensions import Literal
+from .integrations.openai import Agent, Session, ChatOpenAI, BaseChatModel, tool, Sequence, BaseTool, StructuredTool
+from .integrations.cache import Embedding_Cache, Response_Cache
+from .integrations.qdrant_db import Vector_DB, QdrantClient, OpenAIEmbeddings, _async_client
+from .integrations.local_db import Local_Vector_DB
+from .tracing import span
+from langchain_core.pydantic_v1 import BaseModel
+
+def _format_recall(results : list[tuple[str, float]]) -> str:
+    if(not results):
+        return "You found nothing about this in your memory."
+    report = "You found the following in your memory:\n\n"
+    for text, score in results:
+        report += f"({score:.2f}) {text}\n"
+    return report
+
+def _memory_entry(memory : str, topic : str, subtopic : str, tenant : str | None) -> tuple[str, dict[str, Any]]:
+    """Get the text and the metadata a memory is stored with, the text keeps the topics so they are part of its embedding."""
+
+    metadata = {"topic" : topic, "subtopic" : subtopic, "timestamp" : time.time()}
+    if(tenant is not None):
+        metadata["tenant"] = tenant
+    return f"'Broad Topic' : '{topic}'; 'Sub Topic' : '{subtopic}'; 'Memory' : '{memory}'", metadata
+
+class _Memory_Input(BaseModel):
+    memory : str
+    topic : str
+    subtopic : str
+
+class _Query_Input(BaseModel):
+    query : str
+
+def _add_to_memory_tool(memory_db : Vector_DB | Local_Vector_DB, tenant : str | None, duplicate_threshold : float | None) -> BaseTool:
+    """Create the tool of the main agent to write to the memory database."""
+
+    def added(amount : int) -> str:
+        if(amount == 0):
+            return "You already remember this, simply look for the topic in your memory."
+        return "You will remember this from now on, simply look for the topic in your memory."
+
+    def add_to_memory(memory : str, topic : str, subtopic : str) -> str:
+        """Use this tool when you need to remember something in the future.
+        Give the memory itself, the broad topic it belongs to and its sub topic."""
+
+        return added(memory_db.add_to_db(*_memory_entry(memory, topic, subtopic, tenant), duplicate_threshold=duplicate_threshold))
+
+    async def aadd_to_memory(memory : str, topic : str, subtopic : str) -> str:
+        return added(await memory_db.aadd_to_db(*_memory_entry(memory, topic, subtopic, tenant), duplicate_threshold=duplicate_threshold))
+
+    return StructuredTool.from_function(func=add_to_memory, coroutine=aadd_to_memory, args_schema=_Memory_Input)
+
+def _get_from_memory_tool(memory_agent : Agent) -> BaseTool:
+    """Create the tool of the main agent to ask the memory agent."""
+
+    def get_from_memory(query : str) -> str:
+        """Use this tool when you need to remember about a topic.
+        You can provide a broad or sub topic as the query."""
+
+        return memory_agent.execute(f"Recall everything in the memory about:\n{query}")
+
+    async def aget_from_memory(query : str) -> str:
+        return await memory_agent.aexecute(f"Recall everything in the memory about:\n{query}")
+
+    return StructuredTool.from_function(func=get_from_memory, coroutine=aget_from_memory, args_schema=_Query_Input)
+
+def _recall_memory_tool(memory_db : Vector_DB | Local_Vector_DB, rerank : bool, filters : dict[str, Any] | None) -> BaseTool:
+    """Create the tool of the main agent to search the memory database directly."""
+
+    # A vector score of 0.5 without any query words in the memory gives a hybrid score of 0.35.
+    accuracy = 0.35 if rerank else 0.75
+
+    def recall_memory(query : str) -> str:
+        """Use this tool when you need to remember about a topic.
+        You can provide a broad or sub topic as the query.
+        You get back the best matching memories with how well they match the query between 0 and 1."""
+
+        return _format_recall(memory_db.get_scored_from_db(query, 10, accuracy, filters=filters, hybrid=rerank))
+
+    async def arecall_memory(query : str) -> str:
+        return _format_recall(await memory_db.aget_scored_from_db(query, 10, accuracy, filters=filters, hybrid=rerank))
+
+    return StructuredTool.from_function(func=recall_memory, coroutine=arecall_memory, args_schema=_Query_Input)
+
+def _query_memory_tool(memory_db : Vector_DB | Local_Vector_DB, filters : dict[str, Any] | None) -> BaseTool:
+    """Create the tool of the memory agent to search the memory database."""
+
+    def query_memory(query : str) -> str:
+        """Use this tool to look into your memory.
+        The query should be the broad subject you want to recall about."""
+
+        report = "You found the following in your memory:\n\n"
+        for result in memory_db.get_from_db(query, 10, 0.75, filters=filters):
+            report += result + "\n"
+        return report
+
+    async def aquery_memory(query : str) -> str:
+        report = "You found the following in your memory:\n\n"
+        for result in await memory_db.aget_from_db(query, 10, 0.75, filters=filters):
+            report += result + "\n"
+        return report
+
+    return StructuredTool.from_function(func=query_memory, coroutine=aquery_memory, args_schema=_Query_Input)
 
 class Robot():
     """An agent model with an integrated memory agent using a vector database."""
 
-    def __init__(self, memory_vector_db : Vector_DB, system_prompt : str, openai_api_key : str | None = None, openai_model : str = "gpt-3.5-turbo", temperature : float = 0.7, additional_tools : Sequence[BaseTool] = [], debug : bool = False) -> None:
+    def __init__(self, memory_vector_db : Vector_DB | Local_Vector_DB, system_prompt : str, openai_api_key : str | None = None, openai_model : str = "gpt-3.5-turbo", temperature : float = 0.7, additional_tools : Sequence[BaseTool] = [], debug : bool = False, max_concurrency : int | None = None, recall_mode : Literal["agent", "direct", "rerank"] = "agent", response_cache : Response_Cache | None = None, llm : BaseChatModel | None = None, memory_llm : BaseChatModel | None = None, parallel_tool_calls : bool = True, max_parallel_tools : int | None = None, tool_timeout : float | None = None, tenant : str | None = None, duplicate_threshold : float | None = None) -> None:
         """An agent model with an integrated memory agent using a vector database.
         
         Arguments:
 
-            `memory_vector_db`: The vector database to use for memory.
+            `memory_vector_db`: The vector database to use for memory, either a `Vector_DB` or a `Local_Vector_DB`.
             `system_promt`: The system promt for the main agent.
             `openai_api_key`: The openai API key, leave as `None` to use the enviorment variable `OPENAI_API_KEY`.
             `openai_model`: The LLM model the main agent uses.
             `temperature`: The temperature value for the LLM, needs to be between `0` and `1` inclusive.
             `additional_tools`: The additional tools the agent can use, besides those for memory.
             `debug`: Weather or not the agent should print a log to the console.
+            `max_concurrency`: The maximum amount of conversations `aexecute` runs at the same time, leave as `None` for no limit.
+            `recall_mode`: How memories are recalled, needs to be one of: `'agent'` to let a memory agent summarize the results, `'direct'` to give the best matches with their score straight to the main agent, `'rerank'` to search the memory by its vectors and the words of the query together.
+            `response_cache`: The cache to reuse responses to repeated prompts and results of deterministic tools from, responses are only shared between robots with the same memory database and tenant and are removed whenever something is added to the memory, leave as `None` to always run the agent.
+            `llm`: The chat model of the main agent, share one between robots to share its connections, leave as `None` to create one from `openai_model` and `temperature`.
+            `memory_llm`: The chat model of the memory agent, share one between robots to share its connections, leave as `None` to create one.
+            `parallel_tool_calls`: Weather or not the tool calls the model requests in one turn should run concurrently.
+            `max_parallel_tools`: The maximum amount of tool calls running at the same time, leave as `None` for no limit.
+            `tool_timeout`: The maximum amount of seconds a tool call can take before the model is told it timed out, leave as `None` for no limit.
+            `tenant`: The tenant the memories of the robot belong to, they are stored with it and only the memories of the tenant are recalled, use this to share one database between robots, leave as `None` to use the whole database.
+            `duplicate_threshold`: The score above which a new memory counts as a duplicate of an existing one and is not added, for example `0.95`, leave as `None` to add every memory.
                 
         Examples:
 
@@ -41,60 +156,324 @@ class Robot():
 
         openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
 
-        tools = [self.__add_to_memory, self.__get_from_memory]
+        self.__max_concurrency = max_concurrency
+        self.__concurrency_limits = weakref.WeakKeyDictionary()
+
+        self.__memory_db = memory_vector_db
+        self.__tenant = tenant
+        self.__duplicate_threshold = duplicate_threshold
+        self.__filters = {"tenant" : tenant} if tenant is not None else None
+
+        if(recall_mode == "agent"):
+            memory_system_promt = """You are responsible for managing the Memory.
+            Only use information that is provied to you! Don't make something up!
+            When recalling memories, give back all the relevant information for the requested subject and leave out the unimportant parts."""
+
+            self.__memory_agent = Agent(openai_api_key=openai_api_key, openai_model = "gpt-3.5-turbo", temperature = 0.15, tools = [_query_memory_tool(memory_vector_db, self.__filters)], system_prompt = memory_system_promt, max_iterations = 2, debug=debug, llm=memory_llm)
+            tools = [_add_to_memory_tool(memory_vector_db, tenant, duplicate_threshold), _get_from_memory_tool(self.__memory_agent)]
+        else:
+            tools = [_add_to_memory_tool(memory_vector_db, tenant, duplicate_threshold), _recall_memory_tool(memory_vector_db, rerank=recall_mode == "rerank", filters=self.__filters)]
+
         for tool in additional_tools:
             tools.append(tool)
-        
-        self.__memory_db = memory_vector_db
-        self.__memory_db_id = id(self.__memory_db)
 
-        memory_system_promt = f"""Your 'memory_db_id' = '{str(self.__memory_db_id)}'\n
-        You are responsible for managing the Memory.
-        Only use information that is provied to you! Don't make something up!
-        When recalling memories, give back all the relevant information for the requested subject and leave out the unimportant parts."""
+        self.__main_agent = Agent(openai_api_key=openai_api_key, openai_model=openai_model, temperature=temperature, tools=tools, system_prompt=system_prompt, max_iterations=None, debug=debug, response_cache=response_cache, llm=llm, parallel_tool_calls=parallel_tool_calls, max_parallel_tools=max_parallel_tools, tool_timeout=tool_timeout, cache_scope=f"{memory_vector_db.db_name}\0{tenant or ''}")
+        if(response_cache is not None):
+            memory_vector_db.add_write_hook(self.__main_agent.clear_cache)
 
-        self.__memory_agent = Agent(openai_api_key=openai_api_key, openai_model = "gpt-3.5-turbo", temperature = 0.15, tools = [self.__query_memory], system_prompt = memory_system_promt, max_iterations = 2, debug=debug)
-        self.__memory_agent_id = id(self.__memory_agent)
-        self.__main_agent = Agent(openai_api_key=openai_api_key, openai_model=openai_model, temperature=temperature, tools=tools, system_prompt="Your 'memory_db_id' = '" + str(self.__memory_db_id) + "'\nYour 'memory_agent_id' = '" + str(self.__memory_agent_id) + "'\n\n" + system_prompt, max_iterations=None, debug=debug)
+    def create_memory(self) -> None:
+        """Create the memory database if it does not exist yet."""
 
-    @tool
-    def __add_to_memory(memory_db_id : int, memory : str) -> str:
-        """Use this tool when you need to remember something in the future.
-        Your memory should follow the following format:
-        'Broad Topic' : '<broad_topic>'; 'Sub Topic' : '<sub_topic>'; 'Memory' : '<memory>'
-        Replace the placeholders <> with the corosponding values."""
+        self.__memory_db.create_db()
 
-        cast(memory_db_id, py_object).value.add_to_db(memory)
-        return "You will remember this from now on, simply look for the topic in your memory."
+    def add_to_memory(self, memory : str, topic : str, subtopic : str) -> bool:
+        """Add a memory to the memory database, the same way the robot remembers something itself.
 
-    @tool
-    def __get_from_memory(memory_agent_id : int, query : str) -> str:
-        """Use this tool when you need to remember about a topic.
-        You can provide a broad or sub topic as the query."""
+        Arguments:
 
-        return cast(memory_agent_id, py_object).value.execute(f"Recall everything in the memory about:\n{query}")
+            `memory`: The memory to add.
+            `topic`: The broad topic of the memory.
+            `subtopic`: The sub topic of the memory.
 
+        Returns:
 
-    @tool
-    def __query_memory(memory_db_id : int, query : str) -> str:
-        """Use this tool to look into your memory.
-        The query should be the broad subject you want to recall about."""
+            Weather or not the memory was added, a duplicate of an existing memory is not.
 
-        report = "You found the following in your memory:\n\n"
-        for result in cast(memory_db_id, py_object).value.get_from_db(query, 10, 0.75):
-            report += result + "\n"
-        return report
-    
-    
-    def execute(self, prompt : str) -> str:
+        Examples:
+
+        .. code-block:: python
+            robot.add_to_memory(memory=\"The favourite color of the user is blue.\", topic=\"User\", subtopic=\"Favourite color\")"""
+
+        return self.__memory_db.add_to_db(*_memory_entry(memory, topic, subtopic, self.__tenant), duplicate_threshold=self.__duplicate_threshold) > 0
+
+    async def aadd_to_memory(self, memory : str, topic : str, subtopic : str) -> bool:
+        """Add a memory to the memory database asynchronously, the same way the robot remembers something itself.
+
+        Arguments:
+
+            `memory`: The memory to add.
+            `topic`: The broad topic of the memory.
+            `subtopic`: The sub topic of the memory.
+
+        Returns:
+
+            Weather or not the memory was added, a duplicate of an existing memory is not."""
+
+        return await self.__memory_db.aadd_to_db(*_memory_entry(memory, topic, subtopic, self.__tenant), duplicate_threshold=self.__duplicate_threshold) > 0
+
+    def compact_memory(self, similarity : float = 0.95, max_age : float | None = None) -> dict[str, int | float]:
+        """Merge near duplicate memories and remove stale ones, only the memories of the tenant of the robot are compacted.
+
+        Arguments:
+
+            `similarity`: The minimum score two memories need to count as duplicates, needs to be between `0` and `1` inclusive.
+            `max_age`: The amount of seconds after which a memory is stale and removed, leave as `None` to keep old memories.
+
+        Returns:
+
+            A report with the amount of memories `before` and `after`, the amount of `duplicates` and `stale` memories removed and the mean seconds a recall took `latency_before` and `latency_after`.
+
+        Examples:
+
+        .. code-block:: python
+            report = robot.compact_memory(similarity=0.95, max_age=90 * 86400)"""
+
+        return self.__memory_db.compact(similarity=similarity, max_age=max_age, filters=self.__filters)
+
+    async def acompact_memory(self, similarity : float = 0.95, max_age : float | None = None) -> dict[str, int | float]:
+        """Merge near duplicate memories and remove stale ones in a background thread, only the memories of the tenant of the robot are compacted.
+
+        Arguments:
+
+            `similarity`: The minimum score two memories need to count as duplicates, needs to be between `0` and `1` inclusive.
+            `max_age`: The amount of seconds after which a memory is stale and removed, leave as `None` to keep old memories.
+
+        Returns:
+
+            A report with the amount of memories `before` and `after`, the amount of `duplicates` and `stale` memories removed and the mean seconds a recall took `latency_before` and `latency_after`."""
+
+        return await asyncio.to_thread(self.compact_memory, similarity, max_age)
+
+    def execute(self, prompt : str, session : Session | None = None) -> str:
         """Execute the agent with the given prompt as user input.
         
         Arguments:
 
             `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
                 
         Returns: 
         
             The agent output after fully executing."""
         
-        return self.__main_agent.execute(prompt=prompt)
+        with span("robot.execute", tenant=self.__tenant):
+            return self.__main_agent.execute(prompt=prompt, session=session)
+
+    async def aexecute(self, prompt : str, session : Session | None = None) -> str:
+        """Execute the agent asynchronously with the given prompt as user input.
+        Many conversations can run concurrently on one event loop, bounded by `max_concurrency`.
+        
+        Arguments:
+
+            `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
+                
+        Returns: 
+        
+            The agent output after fully executing."""
+
+        with span("robot.execute", tenant=self.__tenant):
+            limit = self.__concurrency_limit()
+            if(limit is None):
+                return await self.__main_agent.aexecute(prompt=prompt, session=session)
+            async with limit:
+                return await self.__main_agent.aexecute(prompt=prompt, session=session)
+
+    def stream(self, prompt : str, session : Session | None = None) -> Iterator[dict[str, Any]]:
+        """Execute the agent with the given prompt as user input and get its progress while it runs.
+        The tool calls, including those of the memory, are given as soon as they start and finish and the tokens of the answer as soon as the model writes them.
+
+        Arguments:
+
+            `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
+
+        Returns:
+
+            An iterator of events, every event is a dictionary with a `type` of either `'tool_start'` with the `tool` and its `input`, `'tool_end'` with the `tool` and its `output`, `'token'` with the `content` of the token or `'end'` with the full `output` of the agent as the last event.
+
+        Examples:
+
+        .. code-block:: python
+            for event in robot.stream(\"What did I calculate yesterday?\"):
+                if(event[\"type\"] == \"token\"):
+                    print(event[\"content\"], end=\"\", flush=True)"""
+
+        return self.__main_agent.stream(prompt=prompt, session=session)
+
+    async def astream(self, prompt : str, session : Session | None = None) -> AsyncIterator[dict[str, Any]]:
+        """Execute the agent asynchronously with the given prompt as user input and get its progress while it runs.
+        Many conversations can run concurrently on one event loop, bounded by `max_concurrency`.
+
+        Arguments:
+
+            `prompt`: The prompt for the agent as user input.
+            `session`: The conversation the prompt belongs to, its history is sent with the prompt and the turn is added to it, leave as `None` for a prompt without history.
+
+        Returns:
+
+            An async iterator of events, every event is a dictionary with a `type` of either `'tool_start'` with the `tool` and its `input`, `'tool_end'` with the `tool` and its `output`, `'token'` with the `content` of the token or `'end'` with the full `output` of the agent as the last event."""
+
+        limit = self.__concurrency_limit()
+        if(limit is None):
+            async for event in self.__main_agent.astream(prompt=prompt, session=session):
+                yield event
+            return
+        async with limit:
+            async for event in self.__main_agent.astream(prompt=prompt, session=session):
+                yield event
+
+    def __concurrency_limit(self) -> asyncio.Semaphore | None:
+        if(not self.__max_concurrency):
+            return None
+        return self.__concurrency_limits.setdefault(asyncio.get_running_loop(), asyncio.Semaphore(self.__max_concurrency))
+
+class Robot_Pool():
+    """A pool of robots for many tenants that share their chat models, embeddings model and database clients."""
+
+    def __init__(self, system_prompt : str, db_name : str = "memory", db_url : str | None = None, db_api_key : str | None = None, local_db_path : str | None = None, openai_api_key : str | None = None, openai_model : str = "gpt-3.5-turbo", temperature : float = 0.7, additional_tools : Sequence[BaseTool] = [], recall_mode : Literal["agent", "direct", "rerank"] = "agent", embedding_cache : Embedding_Cache | None = None, response_cache : Response_Cache | None = None, max_robots : int = 1000, idle_timeout : float | None = None, debug : bool = False, shared_db : bool = False, duplicate_threshold : float | None = None) -> None:
+        """A pool of robots for many tenants that share their chat models, embeddings model and database clients.
+        Every tenant gets its own robot with its own memory database named `<db_name>_<tenant>`, or with its own part of one shared memory database named `<db_name>`.
+
+        Arguments:
+
+            `system_prompt`: The system promt for the main agent of every robot.
+            `db_name`: The prefix of the memory database names.
+            `db_url`: The qdrant database url or `':memory:'` for a local in-memory database, leave as `None` to use the enviorment variable `QDRANT_DATABASE_URL`.
+            `db_api_key`: The qdrant API key, leave as `None` to use the enviorment variable `QDRANT_API_KEY`.
+            `local_db_path`: The folder to store `Local_Vector_DB` memories in, leave as `None` to use qdrant.
+            `openai_api_key`: The openai API key, leave as `None` to use the enviorment variable `OPENAI_API_KEY`.
+            `openai_model`: The LLM model the main agents use.
+            `temperature`: The temperature value for the LLM, needs to be between `0` and `1` inclusive.
+            `additional_tools`: The additional tools the agents can use, besides those for memory.
+            `recall_mode`: How memories are recalled, needs to be one of: `'agent'`, `'direct'`, `'rerank'`.
+            `embedding_cache`: The cache to look up embeddings in before calling the embeddings API, leave as `None` to embed every text.
+            `response_cache`: The cache to reuse responses to repeated prompts from, every tenant only gets its own cached responses, leave as `None` to always run the agents.
+            `max_robots`: The maximum amount of robots kept in the pool, the least recently used ones are removed first.
+            `idle_timeout`: The amount of seconds after which an unused robot is removed, leave as `None` to keep robots until the pool is full.
+            `debug`: Weather or not the agents should print a log to the console.
+            `shared_db`: Weather or not all tenants share one qdrant collection where every memory is stored with its tenant, use this for many tenants as one collection with a tenant index stays fast while many collections do not.
+            `duplicate_threshold`: The score above which a new memory counts as a duplicate of an existing one of the same tenant and is not added, for example `0.95`, leave as `None` to add every memory.
+
+        Examples:
+
+        .. code-block:: python
+            from rhythm.robot import Robot_Pool
+
+            pool = Robot_Pool(system_prompt=\"You are a helpful assistant.\", max_robots=500, idle_timeout=900)
+            pool.warm_up([\"alice\", \"bob\"])
+            pool.get(\"alice\").execute(\"Remember that my favourite color is blue.\")"""
+
+        openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
+        db_url = db_url or os.environ.get("QDARANT_DATABASE_URL")
+        db_api_key = db_api_key or os.environ.get("QDRANT_API_KEY")
+
+        self.__system_prompt = system_prompt
+        self.__db_name = db_name
+        self.__local_db_path = local_db_path
+        self.__openai_model = openai_model
+        self.__temperature = temperature
+        self.__additional_tools = additional_tools
+        self.__recall_mode = recall_mode
+        self.__embedding_cache = embedding_cache
+        self.__response_cache = response_cache
+        self.__max_robots = max_robots
+        self.__idle_timeout = idle_timeout
+        self.__debug = debug
+        if(shared_db and local_db_path):
+            raise ValueError("A shared memory database needs qdrant, leave local_db_path as None.")
+        self.__shared_db = shared_db
+        self.__duplicate_threshold = duplicate_threshold
+
+        self.__llm = ChatOpenAI(model=openai_model, temperature=temperature, api_key=openai_api_key)
+        self.__memory_llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.15, api_key=openai_api_key)
+        self.__embeddings = OpenAIEmbeddings(api_key=openai_api_key)
+        self.__client = None if local_db_path else QdrantClient(location=db_url, api_key=db_api_key)
+        self.__async_client = None if local_db_path else _async_client(self.__client, db_url, db_api_key)
+        self.__robots = OrderedDict()
+        self.__lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """The amount of robots in the pool."""
+
+        return len(self.__robots)
+
+    def get(self, tenant : str) -> Robot:
+        """Get the robot of a tenant, it is created together with its memory database if it is not in the pool.
+
+        Arguments:
+
+            `tenant`: The name of the tenant.
+
+        Returns:
+
+            The robot of the tenant."""
+
+        with self.__lock:
+            self.__evict_idle()
+            entry = self.__robots.pop(tenant, None)
+            robot = entry[0] if entry is not None else self.__create(tenant)
+            self.__robots[tenant] = (robot, time.monotonic())
+            while(len(self.__robots) > self.__max_robots):
+                self.__robots.popitem(last=False)
+            return robot
+
+    def warm_up(self, tenants : Iterable[str]) -> None:
+        """Create the robots and memory databases of tenants ahead of their first request.
+
+        Arguments:
+
+            `tenants`: The names of the tenants."""
+
+        for tenant in tenants:
+            self.get(tenant)
+
+    def remove(self, tenant : str) -> None:
+        """Remove the robot of a tenant from the pool, its memory is kept.
+
+        Arguments:
+
+            `tenant`: The name of the tenant."""
+
+        with self.__lock:
+            self.__robots.pop(tenant, None)
+
+    def evict_idle(self) -> int:
+        """Remove the robots that were not used for longer than `idle_timeout`.
+
+        Returns:
+
+            The amount of removed robots."""
+
+        with self.__lock:
+            return self.__evict_idle()
+
+    def __evict_idle(self) -> int:
+        if(self.__idle_timeout is None):
+            return 0
+        evicted = 0
+        deadline = time.monotonic() - self.__idle_timeout
+        while(self.__robots and next(iter(self.__robots.values()))[1] < deadline):
+            self.__robots.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def __create(self, tenant : str) -> Robot:
+        db_name = self.__db_name if self.__shared_db else f"{self.__db_name}_{tenant}"
+        if(self.__local_db_path):
+            memory_db = Local_Vector_DB(db_name=db_name, db_path=self.__local_db_path, embedding_cache=self.__embedding_cache, embeddings=self.__embeddings)
+        else:
+            memory_db = Vector_DB(db_name=db_name, embedding_cache=self.__embedding_cache, client=self.__client, embeddings=self.__embeddings, async_client=self.__async_client)
+        memory_db.create_db()
+        return Robot(memory_vector_db=memory_db, system_prompt=self.__system_prompt, openai_model=self.__openai_model, temperature=self.__temperature, additional_tools=self.__additional_tools, debug=self.__debug, recall_mode=self.__recall_mode, response_cache=self.__response_cache, llm=self.__llm, memory_llm=self.__memory_llm, tenant=tenant if self.__shared_db else None, duplicate_threshold=self.__duplicate_threshold)
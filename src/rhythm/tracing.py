@@ -0,0 +1,478 @@
+"""A module containing the tracing of agent runs, LLM calls, tool calls and integration requests.
+Tracing is off until a tracer is set with `set_tracer`, until then every span and counter is a no-op."""
+
+import os
+import json
+import math
+import time
+import bisect
+import random
+import threading
+import contextvars
+from collections import deque
+from typing import Any, Iterable, Sequence, TextIO
+
+class Span():
+    """A timed operation, spans started while another one is active become its children."""
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start", "duration", "error", "_tracer", "_started", "_token")
+
+    def __init__(self, tracer : "Tracer", name : str, attributes : dict[str, Any], parent : "Span | None") -> None:
+        self.name = name
+        self.attributes = attributes
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.trace_id = parent.trace_id if parent is not None else f"{random.getrandbits(128):032x}"
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self._tracer = tracer
+        self._started = time.perf_counter()
+        self._token = None
+
+    def set(self, **attributes : Any) -> None:
+        """Add attributes to the span.
+
+        Arguments:
+
+            `attributes`: The attributes to add, as keyword arguments."""
+
+        self.attributes.update(attributes)
+
+    def end(self, error : BaseException | str | None = None) -> None:
+        """End the span and send it to the sinks of its tracer, only needed for spans from `Tracer.start_span`.
+
+        Arguments:
+
+            `error`: The error the operation failed with, leave as `None` if it succeeded."""
+
+        if(self.duration is not None):
+            return
+        self.duration = time.perf_counter() - self._started
+        if(error is not None):
+            self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        self._tracer._finish(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Get the span as a dictionary that can be stored as JSON.
+
+        Returns:
+
+            A dictionary with the `name`, `trace_id`, `span_id`, `parent_id`, `start`, `duration`, `error` and `attributes` of the span."""
+
+        return {"name" : self.name, "trace_id" : self.trace_id, "span_id" : self.span_id, "parent_id" : self.parent_id, "start" : self.start, "duration" : self.duration, "error" : self.error, "attributes" : self.attributes}
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, error_type : Any, error : BaseException | None, traceback : Any) -> None:
+        _current_span.reset(self._token)
+        self.end(error)
+
+class _No_Span():
+    """The span given out while tracing is off, it does nothing."""
+
+    __slots__ = ()
+
+    def set(self, **attributes : Any) -> None:
+        pass
+
+    def end(self, error : BaseException | str | None = None) -> None:
+        pass
+
+    def __enter__(self) -> "_No_Span":
+        return self
+
+    def __exit__(self, error_type : Any, error : BaseException | None, traceback : Any) -> None:
+        pass
+
+_no_span = _No_Span()
+_current_span = contextvars.ContextVar("rhythm_span", default=None)
+_tracer = None
+
+class Sink():
+    """The base of all sinks, a sink receives the finished spans and the metrics of a tracer."""
+
+    def record_span(self, span : Span) -> None:
+        """Receive a finished span.
+
+        Arguments:
+
+            `span`: The finished span."""
+
+    def record_metric(self, kind : str, name : str, value : float, labels : dict[str, str]) -> None:
+        """Receive a metric.
+
+        Arguments:
+
+            `kind`: Either `'count'` for a value added to a counter or `'observe'` for a measured value like a size.
+            `name`: The name of the metric.
+            `value`: The value of the metric.
+            `labels`: The labels of the metric."""
+
+    def close(self) -> None:
+        """Write out everything that is still buffered."""
+
+class Tracer():
+    """Records spans and metrics and sends them to its sinks."""
+
+    def __init__(self, sinks : Sequence[Sink]) -> None:
+        """Records spans and metrics and sends them to its sinks.
+
+        Arguments:
+
+            `sinks`: The sinks to send the finished spans and the metrics to.
+
+        Examples:
+
+        .. code-block:: python
+            from rhythm.tracing import Tracer, Memory_Sink, Prometheus_Sink, set_tracer
+
+            memory = Memory_Sink()
+            prometheus = Prometheus_Sink()
+            set_tracer(Tracer(sinks=[memory, prometheus]))"""
+
+        self.__sinks = list(sinks)
+
+    @property
+    def sinks(self) -> list[Sink]:
+        """The sinks of the tracer."""
+
+        return self.__sinks
+
+    def span(self, name : str, **attributes : Any) -> Span:
+        """Start a span that is active within a `with` block, spans started inside of the block become its children.
+
+        Arguments:
+
+            `name`: The name of the operation, like `'agent.execute'`.
+            `attributes`: The attributes of the span, as keyword arguments.
+
+        Returns:
+
+            The span, to be used as a context manager."""
+
+        return Span(self, name, attributes, _current_span.get())
+
+    def start_span(self, name : str, parent : Span | None = None, **attributes : Any) -> Span:
+        """Start a span without making it active, for operations that start and end in different places, end it with `Span.end`.
+
+        Arguments:
+
+            `name`: The name of the operation.
+            `parent`: The parent of the span, leave as `None` to use the active span.
+            `attributes`: The attributes of the span, as keyword arguments.
+
+        Returns:
+
+            The started span."""
+
+        return Span(self, name, attributes, parent or _current_span.get())
+
+    def count(self, name : str, amount : float = 1, **labels : Any) -> None:
+        """Add to a counter.
+
+        Arguments:
+
+            `name`: The name of the counter, like `'llm_tokens'`.
+            `amount`: The amount to add.
+            `labels`: The labels of the counter, as keyword arguments."""
+
+        labels = {key : str(label) for key, label in labels.items()}
+        for sink in self.__sinks:
+            sink.record_metric("count", name, amount, labels)
+
+    def observe(self, name : str, value : float, **labels : Any) -> None:
+        """Record a measured value, like the size of a batch.
+
+        Arguments:
+
+            `name`: The name of the measurement.
+            `value`: The measured value.
+            `labels`: The labels of the measurement, as keyword arguments."""
+
+        labels = {key : str(label) for key, label in labels.items()}
+        for sink in self.__sinks:
+            sink.record_metric("observe", name, value, labels)
+
+    def close(self) -> None:
+        """Close all sinks of the tracer."""
+
+        for sink in self.__sinks:
+            sink.close()
+
+    def _finish(self, span : Span) -> None:
+        for sink in self.__sinks:
+            sink.record_span(span)
+
+def set_tracer(tracer : Tracer | None) -> None:
+    """Set the tracer every agent and integration reports to.
+
+    Arguments:
+
+        `tracer`: The tracer to use, leave as `None` to turn tracing off."""
+
+    global _tracer
+    _tracer = tracer
+
+def get_tracer() -> Tracer | None:
+    """Get the tracer every agent and integration reports to.
+
+    Returns:
+
+        The tracer or `None` if tracing is off."""
+
+    return _tracer
+
+def span(name : str, **attributes : Any) -> Span | _No_Span:
+    """Start a span with the current tracer, see `Tracer.span`, does nothing while tracing is off."""
+
+    if(_tracer is None):
+        return _no_span
+    return _tracer.span(name, **attributes)
+
+def count(name : str, amount : float = 1, **labels : Any) -> None:
+    """Add to a counter of the current tracer, see `Tracer.count`, does nothing while tracing is off."""
+
+    if(_tracer is not None):
+        _tracer.count(name, amount, **labels)
+
+def observe(name : str, value : float, **labels : Any) -> None:
+    """Record a measured value with the current tracer, see `Tracer.observe`, does nothing while tracing is off."""
+
+    if(_tracer is not None):
+        _tracer.observe(name, value, **labels)
+
+def _percentile(values : list[float], share : float) -> float:
+    """Get a percentile of sorted values by the nearest rank."""
+
+    return values[min(len(values) - 1, max(0, math.ceil(share * len(values)) - 1))]
+
+class Memory_Sink(Sink):
+    """Keeps the latest spans and all metrics in memory, for tests, benchmarks and debugging."""
+
+    def __init__(self, max_spans : int = 10000) -> None:
+        """Keeps the latest spans and all metrics in memory, for tests, benchmarks and debugging.
+
+        Arguments:
+
+            `max_spans`: The maximum amount of spans kept, the oldest ones are dropped first."""
+
+        self.__spans = deque(maxlen=max_spans)
+        self.__counters = {}
+        self.__observations = {}
+        self.__lock = threading.Lock()
+
+    def record_span(self, span : Span) -> None:
+        with self.__lock:
+            self.__spans.append(span)
+
+    def record_metric(self, kind : str, name : str, value : float, labels : dict[str, str]) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            if(kind == "count"):
+                self.__counters[key] = self.__counters.get(key, 0) + value
+            else:
+                self.__observations.setdefault(key, []).append(value)
+
+    def spans(self, name : str | None = None) -> list[Span]:
+        """Get the recorded spans.
+
+        Arguments:
+
+            `name`: The name of the spans to get, leave as `None` to get all spans.
+
+        Returns:
+
+            The spans in the order they ended."""
+
+        with self.__lock:
+            return [span for span in self.__spans if name is None or span.name == name]
+
+    def counter(self, name : str, **labels : Any) -> float:
+        """Get the total of a counter.
+
+        Arguments:
+
+            `name`: The name of the counter.
+            `labels`: The labels the counted values need to have, as keyword arguments, other labels are summed up.
+
+        Returns:
+
+            The total of all matching values."""
+
+        labels = {key : str(label) for key, label in labels.items()}
+        with self.__lock:
+            return sum(value for (counter, counter_labels), value in self.__counters.items() if counter == name and labels.items() <= dict(counter_labels).items())
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """Get the latency of every kind of span.
+
+        Returns:
+
+            A dictionary of every span name with the `count`, `errors` and the `mean`, `p50`, `p99` and `max` seconds of its spans."""
+
+        durations = {}
+        errors = {}
+        for span in self.spans():
+            durations.setdefault(span.name, []).append(span.duration)
+            errors[span.name] = errors.get(span.name, 0) + (span.error is not None)
+        summary = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            summary[name] = {"count" : len(values), "errors" : errors[name], "mean" : sum(values) / len(values), "p50" : _percentile(values, 0.5), "p99" : _percentile(values, 0.99), "max" : values[-1]}
+        return summary
+
+    def clear(self) -> None:
+        """Remove all recorded spans and metrics."""
+
+        with self.__lock:
+            self.__spans.clear()
+            self.__counters.clear()
+            self.__observations.clear()
+
+class JSON_Lines_Sink(Sink):
+    """Writes every span and metric as one line of JSON."""
+
+    def __init__(self, file : str | TextIO, flush_every : int = 100) -> None:
+        """Writes every span and metric as one line of JSON.
+
+        Arguments:
+
+            `file`: The file path to append to or the writable text file object.
+            `flush_every`: The amount of lines after which the file is flushed.
+
+        Examples:
+
+        .. code-block:: python
+            set_tracer(Tracer(sinks=[JSON_Lines_Sink(\"./trace.jsonl\")]))"""
+
+        self.__own_file = isinstance(file, str)
+        self.__writer = open(file, "a") if isinstance(file, str) else file
+        self.__flush_every = flush_every
+        self.__unflushed = 0
+        self.__lock = threading.Lock()
+
+    def record_span(self, span : Span) -> None:
+        self.__write(dict(span.to_dict(), type="span"))
+
+    def record_metric(self, kind : str, name : str, value : float, labels : dict[str, str]) -> None:
+        self.__write({"type" : kind, "name" : name, "value" : value, "labels" : labels, "time" : time.time()})
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__writer.flush()
+            if(self.__own_file):
+                self.__writer.close()
+
+    def __write(self, entry : dict[str, Any]) -> None:
+        line = json.dumps(entry, default=str) + "\n"
+        with self.__lock:
+            self.__writer.write(line)
+            self.__unflushed += 1
+            if(self.__unflushed >= self.__flush_every):
+                self.__writer.flush()
+                self.__unflushed = 0
+
+def _escape(value : str) -> str:
+    """Escape a label value for the Prometheus text format."""
+
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+_default_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Prometheus_Sink(Sink):
+    """Aggregates the spans and metrics into counters and histograms in the Prometheus text format.
+    Span durations become the histogram `<namespace>_span_seconds` with the label `span`, counters get the suffix `_total`."""
+
+    def __init__(self, namespace : str = "rhythm", buckets : Iterable[float] = _default_buckets) -> None:
+        """Aggregates the spans and metrics into counters and histograms in the Prometheus text format.
+
+        Arguments:
+
+            `namespace`: The prefix of all metric names.
+            `buckets`: The upper bounds of the histogram buckets, in seconds for span durations.
+
+        Examples:
+
+        .. code-block:: python
+            prometheus = Prometheus_Sink()
+            set_tracer(Tracer(sinks=[prometheus]))
+            ...
+            prometheus.write(\"./metrics.prom\")"""
+
+        self.__namespace = namespace
+        self.__buckets = sorted(buckets)
+        self.__counters = {}
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+
+    def record_span(self, span : Span) -> None:
+        labels = (("span", span.name),)
+        with self.__lock:
+            self.__observe(("span_seconds", labels), span.duration)
+            if(span.error is not None):
+                self.__counters[("span_errors", labels)] = self.__counters.get(("span_errors", labels), 0) + 1
+
+    def record_metric(self, kind : str, name : str, value : float, labels : dict[str, str]) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            if(kind == "count"):
+                self.__counters[key] = self.__counters.get(key, 0) + value
+            else:
+                self.__observe(key, value)
+
+    def render(self) -> str:
+        """Get all metrics in the Prometheus text format.
+
+        Returns:
+
+            The metrics, ready to be served on a `/metrics` endpoint."""
+
+        lines = []
+        with self.__lock:
+            for name in sorted({name for name, _ in self.__counters}):
+                metric = f"{self.__namespace}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (counter, labels), value in sorted(self.__counters.items()):
+                    if(counter == name):
+                        lines.append(f"{metric}{self.__labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.__histograms}):
+                metric = f"{self.__namespace}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for (histogram, labels), (counts, total, amount) in sorted(self.__histograms.items()):
+                    if(histogram != name):
+                        continue
+                    cumulative = 0
+                    for bound, bucket in zip(self.__buckets, counts):
+                        cumulative += bucket
+                        lines.append(f"{metric}_bucket{self.__labels(labels + (('le', repr(bound)),))} {cumulative}")
+                    lines.append(f"{metric}_bucket{self.__labels(labels + (('le', '+Inf'),))} {amount}")
+                    lines.append(f"{metric}_sum{self.__labels(labels)} {total}")
+                    lines.append(f"{metric}_count{self.__labels(labels)} {amount}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path : str) -> None:
+        """Write all metrics in the Prometheus text format to a file, for example for the textfile collector of the node exporter.
+        The file is replaced at once, so a scraper never reads half of it.
+
+        Arguments:
+
+            `path`: The path of the file."""
+
+        with open(f"{path}.tmp", "w") as writer:
+            writer.write(self.render())
+        os.replace(f"{path}.tmp", path)
+
+    def __observe(self, key : tuple, value : float) -> None:
+        counts, total, amount = self.__histograms.get(key) or ([0] * len(self.__buckets), 0.0, 0)
+        index = bisect.bisect_left(self.__buckets, value)
+        if(index < len(counts)):
+            counts[index] += 1
+        self.__histograms[key] = (counts, total + value, amount + 1)
+
+    def __labels(self, labels : tuple) -> str:
+        if(not labels):
+            return ""
+        return "{" + ",".join(f"{key}=\"{_escape(value)}\"" for key, value in labels) + "}"